@@ -0,0 +1,308 @@
+"""
+Compact columnar container for walk-forward backtest results.
+
+backtest_with_ml returns a full-history float64 DataFrame with ~25 columns
+(basket levels, rolling stats, 8 features, ML outputs, positions, costs and
+four return columns). Most of those are either cheap to rebuild or never
+read after the run. BacktestResult keeps only what cannot be rebuilt:
+
+    - positions as int8
+    - the ML approval mask as a packed bit array
+    - the spread return (ret_long - ret_short) as float64
+    - vol_z, ml_prob and (optionally) the features as float32, with
+      z_score served from vol_z rather than stored twice
+
+turnover, tc and the gross/net/baseline returns are recomputed from those on
+every access instead of being stored, so a result is a small fraction of the
+DataFrame's size and thousands of sweep configurations fit in memory.
+Frames priced with cost_model.apply_constituent_costs are the exception:
+their turnover and costs cannot be rebuilt from the spread position, so
+they are kept as sparse (bar, value) arrays, nonzero only on trade and
+rebalance bars.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+# The 8 ML features from engineer_features / get_feature_columns
+FEATURE_COLUMNS = [
+    'z_score',
+    'z_change_10d',
+    'spread_vol_20d',
+    'days_since_crossing',
+    'corr_20d',
+    'vol_ratio',
+    'vix_level',
+    'vix_percentile',
+]
+
+# Feature columns that engineer_features copies from another stored column;
+# they are served from that column instead of being stored twice
+FEATURE_ALIASES = {'z_score': 'vol_z'}
+
+# Columns recomputed from positions and spread returns on access
+DERIVED_COLUMNS = [
+    'pair_ret', 'turnover', 'tc', 'ret_gross', 'ret_net',
+    'ret_baseline', 'turnover_baseline', 'tc_baseline', 'ret_baseline_net',
+]
+
+# Cost columns that can be supplied instead of derived (stored sparse)
+COST_COLUMNS = ['turnover', 'tc', 'turnover_baseline', 'tc_baseline']
+
+
+def _lagged_pnl(pos, spread_ret):
+    """pos.shift(1) * spread_ret with the first bar set to 0."""
+    out = np.zeros(len(spread_ret))
+    out[1:] = pos[:-1] * spread_ret[1:]
+    return out
+
+
+def _turnover(pos):
+    """pos.diff().abs() with the first bar set to 0."""
+    out = np.zeros(len(pos))
+    out[1:] = np.abs(np.diff(pos.astype(np.int16)))
+    return out
+
+
+def _to_sparse(values):
+    """(positions, values) of the nonzero entries of a mostly-zero column."""
+    values = np.nan_to_num(np.asarray(values, dtype=np.float64))
+    nonzero = np.flatnonzero(values)
+    return nonzero.astype(np.int32), values[nonzero]
+
+
+def _from_sparse(sparse, n):
+    out = np.zeros(n)
+    out[sparse[0]] = sparse[1]
+    return out
+
+
+class BacktestResult:
+    """
+    Compact, read-only view of one backtest_with_ml run.
+
+    Column access (result['ret_net'], result['pos'], ...) returns a pandas
+    Series on the result's dates, so existing analysis cells keep working.
+    Stored arrays are copied on construction and marked non-writeable, so
+    the zero-copy Series and DataFrame views cannot modify the result
+    (in-place edits raise ValueError; call .copy() first).
+
+    Parameters:
+    -----------
+    index : DatetimeIndex - Dates of the backtest
+    pos : array - Strategy position (-1, 0, 1)
+    pos_baseline : array - Baseline (no ML) position
+    spread_ret : array - ret_long - ret_short
+    tc_per_side : float - Transaction cost per side used for tc
+    vol_z : array - Z-score of the volatility spread (optional)
+    ml_prob : array - Walk-forward ML probability (optional)
+    ml_approved : array[bool] - ML approval mask (optional)
+    features : DataFrame or dict - Feature columns to keep as float32 (optional)
+    costs : DataFrame or dict - Any of COST_COLUMNS to store instead of
+            deriving them from position changes (optional)
+    """
+
+    def __init__(self, index, pos, pos_baseline, spread_ret, tc_per_side,
+                 vol_z=None, ml_prob=None, ml_approved=None, features=None, costs=None):
+        self.index = pd.DatetimeIndex(index)
+        self.tc_per_side = tc_per_side
+        self._n = len(self.index)
+
+        self._pos = np.array(pos, dtype=np.int8)
+        self._pos_baseline = np.array(pos_baseline, dtype=np.int8)
+        self._spread_ret = np.array(spread_ret, dtype=np.float64)
+
+        self._float32 = {}
+        self._aliases = {}
+        if vol_z is not None:
+            self._float32['vol_z'] = np.array(vol_z, dtype=np.float32)
+        if ml_prob is not None:
+            self._float32['ml_prob'] = np.array(ml_prob, dtype=np.float32)
+        if features is not None:
+            for col in features:
+                values = np.array(features[col], dtype=np.float32)
+                source = self._float32.get(FEATURE_ALIASES.get(col))
+                if source is not None and np.array_equal(values, source, equal_nan=True):
+                    self._aliases[col] = FEATURE_ALIASES[col]
+                else:
+                    self._float32[col] = values
+
+        self._ml_bits = (
+            np.packbits(np.asarray(ml_approved, dtype=bool))
+            if ml_approved is not None else None
+        )
+
+        self._costs = {}
+        if costs is not None:
+            for col in costs:
+                if col not in COST_COLUMNS:
+                    raise KeyError(f'Not a cost column: {col!r}')
+                self._costs[col] = _to_sparse(costs[col])
+
+        stored = [self._pos, self._pos_baseline, self._spread_ret, *self._float32.values()]
+        for arr in stored + [a for sparse in self._costs.values() for a in sparse]:
+            arr.flags.writeable = False
+
+    @classmethod
+    def from_frame(cls, df, tc_per_side, feature_cols=None, keep_features=False):
+        """
+        Compress a backtest_with_ml DataFrame.
+
+        Parameters:
+        -----------
+        df : DataFrame - Output of backtest_with_ml
+        tc_per_side : float - Cost per side that was used in the backtest
+        feature_cols : list - Feature columns (default: FEATURE_COLUMNS)
+        keep_features : bool - Store the feature columns as float32 (default: False)
+
+        Frames repriced by apply_constituent_costs (they carry 'tc_spread')
+        keep their own turnover and cost columns, so the compressed P&L is
+        the frame's P&L.
+        """
+        features = None
+        if keep_features:
+            features = df[feature_cols if feature_cols is not None else FEATURE_COLUMNS]
+
+        costs = None
+        if 'tc_spread' in df:
+            if 'tc_baseline' not in df:
+                raise ValueError(
+                    'Frame has constituent costs but no tc_baseline; rerun '
+                    'apply_constituent_costs so the baseline is repriced too'
+                )
+            costs = {col: df[col].to_numpy() for col in COST_COLUMNS if col in df}
+
+        return cls(
+            index=df.index,
+            pos=df['pos'].to_numpy(),
+            pos_baseline=df['pos_baseline'].to_numpy(),
+            spread_ret=(df['ret_long'] - df['ret_short']).to_numpy(),
+            tc_per_side=tc_per_side,
+            vol_z=df['vol_z'].to_numpy() if 'vol_z' in df else None,
+            ml_prob=df['ml_prob'].to_numpy() if 'ml_prob' in df else None,
+            ml_approved=df['ml_approved'].to_numpy() if 'ml_approved' in df else None,
+            features=features,
+            costs=costs,
+        )
+
+    # -------------------------------------------------------------------------
+    # Stored columns
+    # -------------------------------------------------------------------------
+
+    @property
+    def pos(self):
+        return self._pos
+
+    @property
+    def pos_baseline(self):
+        return self._pos_baseline
+
+    @property
+    def ml_approved(self):
+        if self._ml_bits is None:
+            return np.ones(self._n, dtype=bool)
+        return np.unpackbits(self._ml_bits, count=self._n).astype(bool)
+
+    # -------------------------------------------------------------------------
+    # Derived columns (computed on access, never stored)
+    # -------------------------------------------------------------------------
+
+    @property
+    def pair_ret(self):
+        return _lagged_pnl(self._pos, self._spread_ret)
+
+    def _stored_cost(self, col):
+        return _from_sparse(self._costs[col], self._n) if col in self._costs else None
+
+    @property
+    def turnover(self):
+        stored = self._stored_cost('turnover')
+        return _turnover(self._pos) if stored is None else stored
+
+    @property
+    def tc(self):
+        stored = self._stored_cost('tc')
+        return self.turnover * (2 * self.tc_per_side) if stored is None else stored
+
+    @property
+    def ret_gross(self):
+        return self.pair_ret
+
+    @property
+    def ret_net(self):
+        return self.pair_ret - self.tc
+
+    @property
+    def ret_baseline(self):
+        return _lagged_pnl(self._pos_baseline, self._spread_ret)
+
+    @property
+    def turnover_baseline(self):
+        stored = self._stored_cost('turnover_baseline')
+        return _turnover(self._pos_baseline) if stored is None else stored
+
+    @property
+    def tc_baseline(self):
+        stored = self._stored_cost('tc_baseline')
+        return self.turnover_baseline * (2 * self.tc_per_side) if stored is None else stored
+
+    @property
+    def ret_baseline_net(self):
+        return self.ret_baseline - self.tc_baseline
+
+    # -------------------------------------------------------------------------
+    # pandas interop
+    # -------------------------------------------------------------------------
+
+    @property
+    def columns(self):
+        cols = ['pos', 'pos_baseline']
+        if self._ml_bits is not None:
+            cols.append('ml_approved')
+        return cols + list(self._float32) + list(self._aliases) + DERIVED_COLUMNS
+
+    def _column_array(self, col):
+        col = self._aliases.get(col, col)
+        if col in self._float32:
+            return self._float32[col]
+        if col in ('pos', 'pos_baseline', 'ml_approved') or col in DERIVED_COLUMNS:
+            return getattr(self, col)
+        raise KeyError(col)
+
+    def __contains__(self, col):
+        return col in self.columns
+
+    def __getitem__(self, col):
+        """Column as a Series; stored arrays are wrapped without copying."""
+        return pd.Series(self._column_array(col), index=self.index, name=col, copy=False)
+
+    def __len__(self):
+        return self._n
+
+    def __repr__(self):
+        return (f'BacktestResult({self._n} bars, {len(self._float32)} float32 columns, '
+                f'{self.nbytes / 1024:.1f} KiB)')
+
+    def to_frame(self, columns=None):
+        """
+        DataFrame view for the notebook analysis cells.
+
+        Stored columns are passed to pandas with copy=False; derived columns
+        are materialized only for the columns requested.
+        """
+        columns = self.columns if columns is None else columns
+        return pd.DataFrame(
+            {col: self._column_array(col) for col in columns},
+            index=self.index, copy=False,
+        )
+
+    @property
+    def nbytes(self):
+        """Memory held by the stored arrays (excluding the shared index)."""
+        total = self._pos.nbytes + self._pos_baseline.nbytes + self._spread_ret.nbytes
+        total += sum(arr.nbytes for arr in self._float32.values())
+        total += sum(a.nbytes for sparse in self._costs.values() for a in sparse)
+        if self._ml_bits is not None:
+            total += self._ml_bits.nbytes
+        return total
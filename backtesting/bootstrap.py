@@ -0,0 +1,344 @@
+"""
+Block-bootstrap significance engine for Sharpe, Sortino and drawdown.
+
+The notebooks compare in-sample vs out-of-sample and ML vs baseline using
+point estimates from calculate_performance_metrics, on as few as 234
+out-of-sample days. This module resamples daily returns with a stationary
+(Politis-Romano) or circular block bootstrap to put confidence intervals
+and paired p-values on those comparisons.
+
+Every resample is drawn from its own child seed and applied to the whole
+returns matrix (days x series) at once, so every pair and strategy sees the
+same resampled days. Resamples are drawn and reduced in chunks sized from a
+per-worker memory budget and can be sharded across a process pool. Sums
+and moments come from day counts with one matrix product; only the
+drawdown walks the resampled paths, one day at a time.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+
+TRADING_DAYS = 252
+
+METRICS = ['sharpe_ratio', 'sortino_ratio', 'max_drawdown', 'ann_return']
+
+
+# =============================================================================
+# RESAMPLE INDICES
+# =============================================================================
+
+def default_block_length(n_obs):
+    """Rule-of-thumb block length n^(1/3) (about 6 for one year of data)."""
+    return max(1, int(round(n_obs ** (1 / 3))))
+
+
+def _resample_seeds(n_boot, seed):
+    """One child SeedSequence per resample, so the draws do not depend on chunking."""
+    return np.random.SeedSequence(seed).spawn(n_boot)
+
+
+def _draw_indices(n_obs, seeds, block_len, method):
+    """Resample indices (len(seeds) x n_obs) for one chunk of resamples."""
+    n = len(seeds)
+    rngs = [np.random.default_rng(s) for s in seeds]
+
+    if method == 'stationary':
+        # Each day starts a new block with probability 1/block_len
+        new_block = np.empty((n, n_obs), dtype=bool)
+        starts = np.empty((n, n_obs), dtype=np.int32)
+        for b, rng in enumerate(rngs):
+            new_block[b] = rng.random(n_obs) < 1.0 / block_len
+            starts[b] = rng.integers(0, n_obs, size=n_obs, dtype=np.int32)
+        new_block[:, 0] = True
+
+        # Position of the most recent block start, per row
+        steps = np.arange(n_obs, dtype=np.int32)
+        last_start = np.maximum.accumulate(np.where(new_block, steps, 0), axis=1)
+        block_origin = np.take_along_axis(starts, last_start, axis=1)
+        idx = (block_origin + (steps - last_start)) % n_obs
+
+    elif method == 'circular':
+        n_blocks = -(-n_obs // block_len)
+        starts = np.stack([rng.integers(0, n_obs, size=n_blocks, dtype=np.int32) for rng in rngs])
+        idx = (starts[:, :, None] + np.arange(block_len, dtype=np.int32)) % n_obs
+        idx = idx.reshape(n, -1)[:, :n_obs]
+
+    else:
+        raise ValueError(f'Unknown bootstrap method: {method!r}')
+
+    return idx.astype(np.int32)
+
+
+def bootstrap_indices(n_obs, n_boot=10000, block_len=None, method='stationary', seed=42):
+    """
+    Draw block-bootstrap resample indices.
+
+    bootstrap_distributions draws the same indices chunk by chunk; this
+    materializes all of them, e.g. for inspection.
+
+    Parameters:
+    -----------
+    n_obs : int - Number of observations (days)
+    n_boot : int - Number of resamples
+    block_len : int - Block length; mean block length for 'stationary'
+                (default: n_obs^(1/3))
+    method : str - 'stationary' (geometric block lengths) or 'circular' (fixed)
+    seed : int - Random seed
+
+    Returns:
+    --------
+    ndarray[int32] (n_boot x n_obs) : Row b holds the days of resample b
+    """
+    block_len = block_len or default_block_length(n_obs)
+    return _draw_indices(n_obs, _resample_seeds(n_boot, seed), block_len, method)
+
+
+# =============================================================================
+# BATCHED METRICS
+# =============================================================================
+
+def _metrics_from_moments(n_obs, s1, s2, n_neg, n1, n2, max_dd):
+    """Metric definitions of calculate_performance_metrics from per-series sums."""
+    mean = s1 / n_obs
+    var = np.maximum(s2 - s1 * mean, 0.0) / max(n_obs - 1, 1)
+    ann_return = mean * TRADING_DAYS
+    ann_vol = np.sqrt(var) * np.sqrt(TRADING_DAYS)
+
+    # Downside deviation: sample std of the negative days only
+    neg_var = np.maximum(n2 - n1 * n1 / np.maximum(n_neg, 1), 0.0) / np.maximum(n_neg - 1, 1)
+    downside_std = np.where(n_neg > 1, np.sqrt(neg_var) * np.sqrt(TRADING_DAYS), 0.0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sharpe = np.where(ann_vol > 0, ann_return / ann_vol, 0.0)
+        sortino = np.where(downside_std > 0, ann_return / downside_std, 0.0)
+
+    return {
+        'sharpe_ratio': sharpe,
+        'sortino_ratio': sortino,
+        'max_drawdown': max_dd,
+        'ann_return': ann_return,
+    }
+
+
+def _max_drawdown(log_growth, idx=None):
+    """
+    Max drawdown of the compounded equity curve from per-day log(1 + r).
+
+    Walks the days once, keeping only the running log equity, its peak and
+    the worst drawdown per (resample, series): with idx, day t of resample
+    b is row idx[b, t] of a (days x series) log_growth; without it,
+    log_growth is already (boot x days x series).
+    """
+    n_obs = log_growth.shape[0] if idx is not None else log_growth.shape[1]
+    n_boot = len(idx) if idx is not None else log_growth.shape[0]
+
+    log_equity = np.zeros((n_boot, log_growth.shape[-1]))
+    peak = np.full_like(log_equity, -np.inf)
+    worst = np.zeros_like(log_equity)
+    gap = np.empty_like(log_equity)
+    for t in range(n_obs if idx is None else idx.shape[1]):
+        log_equity += log_growth[idx[:, t]] if idx is not None else log_growth[:, t]
+        np.maximum(peak, log_equity, out=peak)
+        np.subtract(log_equity, peak, out=gap)
+        np.minimum(worst, gap, out=worst)
+    return np.expm1(worst)
+
+
+def batch_metrics(resampled):
+    """
+    Performance metrics over the time axis of a (boot x days x series) array.
+
+    Definitions match calculate_performance_metrics (ratios are 0 when the
+    denominator is 0).
+
+    Returns:
+    --------
+    dict : metric name -> ndarray (boot x series)
+    """
+    neg = np.minimum(resampled, 0.0)
+    return _metrics_from_moments(
+        resampled.shape[1],
+        resampled.sum(axis=1),
+        np.einsum('btk,btk->bk', resampled, resampled),
+        np.count_nonzero(neg, axis=1),
+        neg.sum(axis=1),
+        np.einsum('btk,btk->bk', neg, neg),
+        _max_drawdown(np.log1p(np.maximum(resampled, -1.0))),
+    )
+
+
+# Per resample and day: the index draws with their int32/int64 temporaries
+# in _draw_indices, and the int64 / float64 day-count rows
+_INDEX_BYTES_PER_DAY = 64
+
+# float64 (resample x series) rows alive at once: the five moment sums,
+# the metric outputs and the _max_drawdown state (equity, peak, worst, gap
+# and one gathered day)
+_LIVE_ROWS = 16
+
+
+def chunk_size_for_budget(n_obs, n_series, max_memory_bytes):
+    """Resamples per chunk so that one chunk stays within max_memory_bytes."""
+    bytes_per_resample = n_obs * _INDEX_BYTES_PER_DAY + n_series * 8 * _LIVE_ROWS
+    return max(1, int(max_memory_bytes // max(bytes_per_resample, 1)))
+
+
+def _run_shard(returns, seeds, block_len, method, chunk_size):
+    """
+    Draw one shard of resamples chunk by chunk and reduce each to metrics.
+
+    Sums and moments only depend on how often each day is drawn, so they
+    come from one matrix product of the (chunk x days) day counts with
+    [r, r^2, min(r, 0), min(r, 0)^2, r < 0]. Only the drawdown needs the
+    resampled order; it gathers one day at a time, so no
+    (resamples x days x series) array is ever built.
+    """
+    n_obs, n_series = returns.shape
+    neg = np.minimum(returns, 0.0)
+    day_stats = np.hstack([returns, returns * returns, neg, neg * neg, (returns < 0).astype(float)])
+    log_growth = np.log1p(np.maximum(returns, -1.0))
+
+    out = {metric: [] for metric in METRICS}
+    for lo in range(0, len(seeds), chunk_size):
+        idx = _draw_indices(n_obs, seeds[lo:lo + chunk_size], block_len, method)
+        n = len(idx)
+
+        rows = np.arange(n, dtype=np.int64)[:, None] * n_obs
+        counts = np.bincount((rows + idx).ravel(), minlength=n * n_obs).reshape(n, n_obs)
+        s1, s2, n1, n2, n_neg = np.split(counts.astype(float) @ day_stats, 5, axis=1)
+
+        metrics = _metrics_from_moments(
+            n_obs, s1, s2, np.rint(n_neg), n1, n2, _max_drawdown(log_growth, idx)
+        )
+        for metric, values in metrics.items():
+            out[metric].append(values)
+    return {metric: np.concatenate(chunks) for metric, chunks in out.items()}
+
+
+def bootstrap_distributions(returns, n_boot=10000, block_len=None, method='stationary',
+                            seed=42, max_memory_bytes=256 * 1024 ** 2, n_jobs=1):
+    """
+    Bootstrap metric distributions for every column of a returns matrix.
+
+    Resample indices are drawn per chunk from one child seed per resample,
+    so results depend only on `seed`, not on the memory budget or n_jobs,
+    and bootstrap_indices(...) reproduces the indices that were used.
+
+    Parameters:
+    -----------
+    returns : DataFrame (days x series) - Aligned daily returns, e.g. one
+              column per (pair, strategy); NaNs are treated as flat days
+    n_boot : int - Number of resamples (default: 10,000)
+    block_len : int - (Mean) block length (default: n_obs^(1/3))
+    method : str - 'stationary' or 'circular'
+    seed : int - Random seed for the shared resample indices
+    max_memory_bytes : int - Working-memory budget per worker for one chunk
+                       (indices, day counts and drawdown temporaries);
+                       the inputs themselves are not counted (default: 256 MiB)
+    n_jobs : int - Worker processes (1 = in-process, -1 = all cores)
+
+    Returns:
+    --------
+    dict : metric name -> DataFrame (n_boot x series)
+    """
+    if method not in ('stationary', 'circular'):
+        raise ValueError(f'Unknown bootstrap method: {method!r}')
+
+    values = np.ascontiguousarray(returns.fillna(0).to_numpy(dtype=np.float64))
+    block_len = block_len or default_block_length(len(values))
+    seeds = _resample_seeds(n_boot, seed)
+    chunk_size = chunk_size_for_budget(*values.shape, max_memory_bytes)
+
+    if n_jobs == -1:
+        n_jobs = os.cpu_count() or 1
+
+    if n_jobs <= 1:
+        dists = _run_shard(values, seeds, block_len, method, chunk_size)
+    else:
+        bounds = np.linspace(0, n_boot, n_jobs + 1).astype(int)
+        shards = [seeds[lo:hi] for lo, hi in zip(bounds[:-1], bounds[1:])]
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            parts = list(pool.map(_run_shard, [values] * n_jobs, shards, [block_len] * n_jobs,
+                                  [method] * n_jobs, [chunk_size] * n_jobs))
+        dists = {metric: np.concatenate([p[metric] for p in parts]) for metric in METRICS}
+
+    return {
+        metric: pd.DataFrame(dist, columns=returns.columns)
+        for metric, dist in dists.items()
+    }
+
+
+# =============================================================================
+# SUMMARIES & PAIRED TESTS
+# =============================================================================
+
+def confidence_intervals(returns, dists, alpha=0.05):
+    """
+    Point estimates and percentile confidence intervals.
+
+    Returns:
+    --------
+    DataFrame : One row per (series, metric) with point, boot_mean, ci_low, ci_high
+    """
+    point = batch_metrics(returns.fillna(0).to_numpy(dtype=np.float64)[None])
+    rows = []
+    for metric, dist in dists.items():
+        lo, hi = np.nanquantile(dist.to_numpy(), [alpha / 2, 1 - alpha / 2], axis=0)
+        for j, col in enumerate(dist.columns):
+            rows.append({
+                'series': col,
+                'metric': metric,
+                'point': point[metric][0, j],
+                'boot_mean': dist[col].mean(),
+                'ci_low': lo[j],
+                'ci_high': hi[j],
+            })
+    return pd.DataFrame(rows)
+
+
+def paired_comparison(ret_a, ret_b, metric='sharpe_ratio', alpha=0.05, **boot_kwargs):
+    """
+    Paired bootstrap test of metric(a) - metric(b) for each column.
+
+    Both frames are resampled with the same indices, so the difference keeps
+    the day-by-day dependence between e.g. ret_net and ret_baseline_net.
+
+    Parameters:
+    -----------
+    ret_a : DataFrame (days x pairs) - e.g. ML ret_net per pair
+    ret_b : DataFrame (days x pairs) - e.g. baseline ret_baseline_net per pair
+    metric : str - One of METRICS
+    alpha : float - Confidence level for the interval on the difference
+    **boot_kwargs : Passed to bootstrap_distributions
+
+    Returns:
+    --------
+    DataFrame : One row per column with the point difference, its interval
+                and p-values (one-sided H1: a > b, and two-sided)
+    """
+    ret_a, ret_b = ret_a.align(ret_b, join='inner', axis=0)
+    cols = list(ret_a.columns)
+    stacked = pd.concat([ret_a[cols], ret_b[cols]], axis=1, keys=['a', 'b'])
+
+    dist = bootstrap_distributions(stacked, **boot_kwargs)[metric]
+    diff = dist['a'].to_numpy() - dist['b'].to_numpy()
+
+    point = batch_metrics(stacked.fillna(0).to_numpy(dtype=np.float64)[None])[metric][0]
+    point_diff = point[:len(cols)] - point[len(cols):]
+
+    lo, hi = np.quantile(diff, [alpha / 2, 1 - alpha / 2], axis=0)
+    p_one = (diff <= 0).mean(axis=0)
+    p_two = np.minimum(1.0, 2 * np.minimum(p_one, (diff >= 0).mean(axis=0)))
+
+    return pd.DataFrame({
+        'series': cols,
+        'diff': point_diff,
+        'ci_low': lo,
+        'ci_high': hi,
+        'p_value_one_sided': p_one,
+        'p_value_two_sided': p_two,
+    })
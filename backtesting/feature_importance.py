@@ -0,0 +1,206 @@
+"""
+Fold-aware permutation feature importance for the walk-forward ML filter.
+
+v2's analyze_feature_importance reads model.feature_importances_ from a
+single fit, so charts/feature_importance.png is impurity-based and
+in-sample. v4's walk-forward models are discarded without any importance
+output. Here every walk-forward fold is scored on its own held-out slice:
+
+    importance(feature) = Brier(feature column permuted) - Brier(baseline)
+
+The Brier score is used instead of AUC because a 63-bar test slice often
+holds labeled signal days of only one class, where AUC is undefined.
+
+Baseline probabilities are predicted once per fold. All permuted copies of
+the held-out slice (features x repeats) are stacked into one matrix and
+scored with a single predict_proba call. Folds are independent and can be
+spread across a process pool.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+
+from model_cache import RF_PARAMS, ModelCache, walk_forward_folds
+
+
+# =============================================================================
+# SINGLE FOLD
+# =============================================================================
+
+def batched_permutation_importance(model, X, y, n_repeats=10, seed=42):
+    """
+    Permutation importance with one predict_proba call for all permutations.
+
+    Parameters:
+    -----------
+    model : fitted classifier with predict_proba
+    X : ndarray (rows x features) - Held-out features
+    y : ndarray - Held-out binary labels (one class is enough)
+    n_repeats : int - Permutations per feature
+    seed : int - Random seed
+
+    Returns:
+    --------
+    baseline_brier : float
+    drops : ndarray (features x repeats) - Brier(permuted) - Brier(baseline);
+            positive when the feature helps
+    """
+    rng = np.random.default_rng(seed)
+    n_rows, n_features = X.shape
+
+    baseline_brier = np.mean((model.predict_proba(X)[:, 1] - y) ** 2)
+
+    # Stack (features x repeats) copies, each with one column shuffled
+    stacked = np.tile(X, (n_features * n_repeats, 1, 1))
+    perm = rng.permuted(np.tile(np.arange(n_rows), (n_features * n_repeats, 1)), axis=1)
+    feature_of_block = np.repeat(np.arange(n_features), n_repeats)
+    blocks = np.arange(n_features * n_repeats)
+    stacked[blocks[:, None], np.arange(n_rows), feature_of_block[:, None]] = (
+        X[perm, feature_of_block[:, None]]
+    )
+
+    probs = model.predict_proba(stacked.reshape(-1, n_features))[:, 1]
+    probs = probs.reshape(n_features * n_repeats, n_rows)
+
+    permuted_brier = np.mean((probs - y) ** 2, axis=1)
+    drops = permuted_brier.reshape(n_features, n_repeats) - baseline_brier
+
+    return baseline_brier, drops
+
+
+def _fold_importance(fold, y_eval, model_params, n_repeats, seed, cache_args):
+    """Fit (or load) one fold's model and score it on its held-out slice."""
+    hits = misses = 0
+    if cache_args is not None:
+        # Rebuilt per worker with the caller's size limit; counts are sent back
+        cache = ModelCache(*cache_args)
+        model = cache.fit(fold['X_train'], fold['y_train'], model_params)
+        hits, misses = cache.hits, cache.misses
+    else:
+        model = RandomForestClassifier(**model_params)
+        model.fit(fold['X_train'], fold['y_train'])
+
+    labeled = ~np.isnan(y_eval)
+    X = fold['X_test'][labeled]
+    y = y_eval[labeled].astype(int)
+
+    result = {'test_start': fold['test_start'], 'n_eval': len(y),
+              'hits': hits, 'misses': misses}
+    if len(y) == 0:
+        return result
+
+    baseline_brier, drops = batched_permutation_importance(model, X, y, n_repeats, seed)
+    result.update(baseline_brier=baseline_brier, drops=drops)
+    return result
+
+
+# =============================================================================
+# ALL FOLDS
+# =============================================================================
+
+def walk_forward_permutation_importance(df, feature_cols, target_fn,
+                                        min_train_days=252, retrain_freq=63,
+                                        embargo_days=30, forward_window=30,
+                                        model_params=None, n_repeats=10,
+                                        seed=42, n_jobs=1, cache=None):
+    """
+    Held-out permutation importance for every walk-forward fold.
+
+    Held-out labels come from target_fn over the whole history, so a fold's
+    test slice is labeled with outcomes that the model never trained on.
+    Folds with no labeled test rows are skipped; the number skipped is in
+    the result's attrs['n_folds_skipped'] (out of attrs['n_folds']).
+
+    Parameters:
+    -----------
+    df : DataFrame - Output of engineer_features
+    feature_cols : list - Output of get_feature_columns
+    target_fn : callable - create_target_no_lookahead
+    min_train_days, retrain_freq, embargo_days, forward_window : int - As in backtest_with_ml
+    model_params : dict - Classifier parameters (default: RF_PARAMS)
+    n_repeats : int - Permutations per feature per fold
+    seed : int - Random seed
+    n_jobs : int - Worker processes across folds (1 = in-process, -1 = all cores)
+    cache : ModelCache - Reuse fold models fitted by walk_forward_probabilities
+
+    Returns:
+    --------
+    DataFrame : One row per (fold, feature) with date, importance_mean,
+                importance_std, baseline_brier and n_eval
+    """
+    model_params = dict(RF_PARAMS if model_params is None else model_params)
+    if n_jobs == -1:
+        n_jobs = os.cpu_count() or 1
+    if n_jobs > 1:
+        # Parallelism is across folds; keep each forest single-threaded
+        model_params['n_jobs'] = 1
+
+    eval_target = target_fn(df, len(df), forward_window).to_numpy(dtype=float)
+    folds = list(walk_forward_folds(df, feature_cols, target_fn, min_train_days,
+                                    retrain_freq, embargo_days, forward_window))
+
+    cache_args = (cache.cache_dir, cache.max_bytes) if cache is not None else None
+    args = (
+        folds,
+        [eval_target[f['test_start']:f['test_end']] for f in folds],
+        [model_params] * len(folds),
+        [n_repeats] * len(folds),
+        [seed + i for i in range(len(folds))],
+        [cache_args] * len(folds),
+    )
+
+    if n_jobs <= 1:
+        results = list(map(_fold_importance, *args))
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            results = list(pool.map(_fold_importance, *args))
+
+    rows, n_skipped = [], 0
+    for res in results:
+        if cache is not None:
+            cache.hits += res['hits']
+            cache.misses += res['misses']
+        if 'drops' not in res:
+            n_skipped += 1
+            continue
+        for j, feature in enumerate(feature_cols):
+            rows.append({
+                'date': df.index[res['test_start']],
+                'feature': feature,
+                'importance_mean': res['drops'][j].mean(),
+                'importance_std': res['drops'][j].std(),
+                'baseline_brier': res['baseline_brier'],
+                'n_eval': res['n_eval'],
+            })
+
+    result = pd.DataFrame(rows)
+    result.attrs['n_folds'] = len(folds)
+    result.attrs['n_folds_skipped'] = n_skipped
+    return result
+
+
+def importance_stability(fold_importance):
+    """
+    Summarize how stable each feature's importance is across folds.
+
+    Returns:
+    --------
+    DataFrame : Per feature, the mean/std of fold importance, the share of
+                folds where it helped (> 0) and its mean rank (1 = most
+                important); sorted by mean importance
+    """
+    by_fold = fold_importance.pivot(index='date', columns='feature', values='importance_mean')
+    ranks = by_fold.rank(axis=1, ascending=False)
+
+    summary = pd.DataFrame({
+        'mean_importance': by_fold.mean(),
+        'std_importance': by_fold.std(),
+        'pct_folds_positive': (by_fold > 0).mean(),
+        'mean_rank': ranks.mean(),
+        'n_folds': by_fold.notna().sum(),
+    })
+    return summary.sort_values('mean_importance', ascending=False)
@@ -0,0 +1,291 @@
+"""
+Aligned market-data cube built once per run.
+
+In the notebooks every stage re-aligns its inputs by label:
+engineer_features reindexes VIX and recomputes its 252-day percentile for
+each pair, test_cointegration and calculate_half_life intersect indices on
+every call, and SPY is reindexed in each analysis cell. MarketData does all
+of that once: one trading calendar, one contiguous float64 column per
+ticker, the VIX/SPY series already on that calendar, and the integer
+position of the train/test split. Stages below take integer slices of it.
+"""
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy import stats
+from statsmodels.tsa.stattools import coint
+
+
+TRADING_DAYS = 252
+
+
+# =============================================================================
+# MARKET DATA CUBE
+# =============================================================================
+
+class MarketData:
+    """
+    Prices, VIX and SPY aligned to a single trading calendar.
+
+    Parameters:
+    -----------
+    prices : DataFrame - Cleaned close prices (output of download_price_data)
+    vix : Series - VIX close (optional)
+    spy : Series - SPY close (optional)
+    train_end_date : str or Timestamp - Last in-sample date (optional)
+    vix_rank_window : int - Window for the rolling VIX percentile (default: 252)
+
+    Attributes:
+    -----------
+    dates : DatetimeIndex - The trading calendar
+    tickers : list - Column order of `values`
+    values : ndarray (bars x tickers) - Fortran-ordered, so each ticker is contiguous
+    vix_level, vix_percentile, vix_ret : ndarray - VIX forward-filled onto the calendar
+    spy_level, spy_ret : ndarray - SPY on the calendar (returns 0 on gaps)
+    train_end_pos : int - Number of bars <= train_end_date (train = [:pos], test = [pos:])
+    """
+
+    def __init__(self, prices, vix=None, spy=None, train_end_date=None,
+                 vix_rank_window=TRADING_DAYS):
+        self.dates = pd.DatetimeIndex(prices.index)
+        self.tickers = list(prices.columns)
+        self._col = {ticker: i for i, ticker in enumerate(self.tickers)}
+        self.values = np.asfortranarray(prices.to_numpy(dtype=np.float64))
+
+        n = len(self.dates)
+
+        # VIX: forward-fill onto the calendar once, then derive everything from it
+        if vix is not None:
+            vix_aligned = vix.reindex(self.dates, method='ffill')
+            self.vix_level = vix_aligned.to_numpy(dtype=np.float64)
+            self.vix_percentile = (
+                vix_aligned.rolling(vix_rank_window).rank(pct=True).to_numpy(dtype=np.float64)
+            )
+            self.vix_ret = vix_aligned.pct_change().fillna(0).to_numpy(dtype=np.float64)
+        else:
+            self.vix_level = np.full(n, np.nan)
+            self.vix_percentile = np.full(n, np.nan)
+            self.vix_ret = np.zeros(n)
+
+        # SPY benchmark: same treatment as spy_returns.reindex(...).fillna(0)
+        if spy is not None:
+            spy_aligned = spy.reindex(self.dates)
+            self.spy_level = spy_aligned.to_numpy(dtype=np.float64)
+            self.spy_ret = spy.pct_change().reindex(self.dates).fillna(0).to_numpy(dtype=np.float64)
+        else:
+            self.spy_level = np.full(n, np.nan)
+            self.spy_ret = np.zeros(n)
+
+        if train_end_date is not None:
+            self.train_end_pos = int(self.dates.searchsorted(pd.Timestamp(train_end_date), side='right'))
+        else:
+            self.train_end_pos = n
+
+    def __len__(self):
+        return len(self.dates)
+
+    def __repr__(self):
+        return (f'MarketData({len(self.dates)} bars x {len(self.tickers)} tickers, '
+                f'train_end_pos={self.train_end_pos})')
+
+    def series(self, ticker):
+        """Contiguous price array for one ticker (a view, no copy)."""
+        return self.values[:, self._col[ticker]]
+
+    def matrix(self, tickers):
+        """Price matrix (bars x len(tickers)) for a list of tickers."""
+        return self.values[:, [self._col[t] for t in tickers]]
+
+    def position(self, date):
+        """Integer position of the last bar on or before `date`."""
+        return int(self.dates.searchsorted(pd.Timestamp(date), side='right')) - 1
+
+    @property
+    def train_slice(self):
+        return slice(0, self.train_end_pos)
+
+    @property
+    def test_slice(self):
+        return slice(self.train_end_pos, len(self.dates))
+
+    def local_train_end(self, start):
+        """
+        train_end_pos re-based to arrays trimmed to md.dates[start:].
+
+        volatility_metrics returns arrays that begin at calendar position
+        `start`; their train/test split is at [:local] / [local:].
+        """
+        return min(max(self.train_end_pos - start, 0), len(self.dates) - start)
+
+
+# =============================================================================
+# ROLLING HELPERS (trailing window, NaN until the window is full)
+# =============================================================================
+
+def rolling_mean(x, window):
+    """Trailing mean matching pandas Series.rolling(window).mean()."""
+    out = np.full(len(x), np.nan)
+    if len(x) >= window:
+        out[window - 1:] = sliding_window_view(x, window).mean(axis=-1)
+    return out
+
+
+def rolling_std(x, window):
+    """Trailing sample std matching pandas Series.rolling(window).std()."""
+    out = np.full(len(x), np.nan)
+    if len(x) >= window:
+        out[window - 1:] = sliding_window_view(x, window).std(axis=-1, ddof=1)
+    return out
+
+
+def rolling_corr(x, y, window):
+    """Trailing correlation matching pandas Series.rolling(window).corr()."""
+    out = np.full(len(x), np.nan)
+    if len(x) >= window:
+        xw = sliding_window_view(x, window)
+        yw = sliding_window_view(y, window)
+        xc = xw - xw.mean(axis=-1, keepdims=True)
+        yc = yw - yw.mean(axis=-1, keepdims=True)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            out[window - 1:] = (xc * yc).sum(axis=-1) / np.sqrt(
+                (xc * xc).sum(axis=-1) * (yc * yc).sum(axis=-1)
+            )
+    return out
+
+
+# =============================================================================
+# ARRAY-NATIVE STAGES
+# =============================================================================
+
+def basket_index(md, tickers):
+    """Equal-weighted basket normalized to the first bar (as create_basket_index)."""
+    px = md.matrix(tickers)
+    return (px / px[0]).mean(axis=1)
+
+
+def volatility_metrics(md, pair_def, vol_lookback=20, z_lookback=120):
+    """
+    Array version of calculate_volatility_metrics on the shared calendar.
+
+    Returns:
+    --------
+    start : int - First calendar position where every metric is defined
+    metrics : dict of ndarray - Same keys as the notebook DataFrame, each
+              sliced to md.dates[start:]
+    """
+    long_idx = basket_index(md, pair_def['long'])
+    short_idx = basket_index(md, pair_def['short'])
+
+    ret_long = np.r_[0.0, long_idx[1:] / long_idx[:-1] - 1]
+    ret_short = np.r_[0.0, short_idx[1:] / short_idx[:-1] - 1]
+
+    vol_long = rolling_std(ret_long, vol_lookback) * np.sqrt(TRADING_DAYS)
+    vol_short = rolling_std(ret_short, vol_lookback) * np.sqrt(TRADING_DAYS)
+    vol_spread = vol_long - vol_short
+
+    vol_mu = rolling_mean(vol_spread, z_lookback)
+    vol_sig = rolling_std(vol_spread, z_lookback)
+    vol_z = (vol_spread - vol_mu) / vol_sig
+
+    # Windows are nested, so the first valid z-score marks the start
+    start = vol_lookback + z_lookback - 2
+
+    metrics = {
+        'long_idx': long_idx,
+        'short_idx': short_idx,
+        'ret_long': ret_long,
+        'ret_short': ret_short,
+        'vol_long': vol_long,
+        'vol_short': vol_short,
+        'vol_spread': vol_spread,
+        'vol_mu': vol_mu,
+        'vol_sig': vol_sig,
+        'vol_z': vol_z,
+    }
+    return start, {key: arr[start:] for key, arr in metrics.items()}
+
+
+def metrics_frame(md, start, metrics):
+    """Wrap array metrics in a DataFrame on md.dates[start:] for the notebook cells."""
+    return pd.DataFrame(metrics, index=md.dates[start:start + len(metrics['vol_z'])])
+
+
+def vix_features(md, start, end=None):
+    """VIX level and percentile for calendar positions [start:end] (no reindexing)."""
+    return md.vix_level[start:end], md.vix_percentile[start:end]
+
+
+def feature_arrays(md, start, metrics):
+    """
+    Array version of engineer_features on the output of volatility_metrics.
+
+    Rolling features are computed over the trimmed metrics, as in the
+    notebook; the VIX percentile comes from the full calendar (see
+    MarketData), so it is defined from the first trimmed bar.
+
+    Returns:
+    --------
+    dict of ndarray - The 8 FEATURE_COLUMNS, aligned with `metrics`
+    """
+    vol_z = metrics['vol_z']
+    vol_spread = metrics['vol_spread']
+    n = len(vol_z)
+
+    z_change = np.full(n, np.nan)
+    z_change[10:] = vol_z[10:] - vol_z[:-10]
+
+    # Bars since the spread last crossed its rolling mean
+    sign = np.sign(vol_spread - metrics['vol_mu'])
+    crossed = np.zeros(n, dtype=bool)
+    crossed[1:] = np.abs(np.diff(sign)) > 0
+    bars = np.arange(n)
+    days_since_crossing = bars - np.maximum.accumulate(np.where(crossed, bars, 0))
+
+    vix_level, vix_percentile = vix_features(md, start, start + n)
+
+    features = {
+        'z_score': vol_z,
+        'z_change_10d': z_change,
+        'spread_vol_20d': rolling_std(vol_spread, 20),
+        'days_since_crossing': days_since_crossing.astype(np.float64),
+        'corr_20d': rolling_corr(metrics['ret_long'], metrics['ret_short'], 20),
+        'vol_ratio': metrics['vol_long'] / (metrics['vol_short'] + 1e-8),
+        'vix_level': vix_level,
+        'vix_percentile': vix_percentile,
+    }
+    return {key: np.where(np.isinf(arr), np.nan, arr) for key, arr in features.items()}
+
+
+def test_cointegration_arrays(x, y):
+    """
+    Engle-Granger test on two aligned arrays (see test_cointegration).
+
+    Both inputs already share the calendar, so only a joint NaN mask is needed.
+    """
+    valid = ~(np.isnan(x) | np.isnan(y))
+    if valid.sum() < 100:
+        return None, None, False
+
+    score, p_value, _ = coint(x[valid], y[valid])
+    return score, p_value, p_value < 0.05
+
+
+def calculate_half_life_array(spread):
+    """Half-life of mean reversion on an aligned array (see calculate_half_life)."""
+    spread = spread[~np.isnan(spread)]
+    if len(spread) < 50:
+        return np.nan
+
+    centered = spread - spread.mean()
+    spread_lag = centered[:-1]
+    spread_diff = np.diff(centered)
+
+    if len(spread_lag) < 30:
+        return np.nan
+
+    slope, _, _, _, _ = stats.linregress(spread_lag, spread_diff)
+
+    if slope < 0 and slope > -1:
+        return -np.log(2) / np.log(1 + slope)
+    return np.inf  # No mean reversion
@@ -0,0 +1,342 @@
+"""
+Persistent per-fold model cache for the walk-forward ML filter.
+
+backtest_with_ml refits every walk-forward RandomForestClassifier on each
+rerun and throws the model away after predict_proba, so tuning a
+downstream parameter (ml_prob_threshold, z_exit, costs) retrains every fold.
+
+ModelCache keys each fold by a hash of its training arrays and model
+parameters and stores the fitted model plus its out-of-fold probabilities
+on disk. A rerun with identical training data loads the probabilities
+instead of refitting. The directory is kept under a size limit by evicting
+the least recently used entries. Several processes may share one cache
+directory; a file evicted by another process is treated as a miss.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+
+import joblib
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn.ensemble import RandomForestClassifier
+
+
+# Same model as backtest_with_ml
+RF_PARAMS = {
+    'n_estimators': 100,
+    'max_depth': 8,
+    'min_samples_split': 20,
+    'min_samples_leaf': 10,
+    'class_weight': 'balanced',
+    'random_state': 42,
+    'n_jobs': -1,
+}
+
+# Parameters that do not change the fitted model
+_NON_MODEL_PARAMS = {'n_jobs', 'verbose'}
+
+
+def hash_arrays(*arrays, params=None):
+    """
+    Stable SHA-256 of numeric arrays plus a JSON-serializable params dict.
+
+    Shape and dtype are part of the hash, so a reshaped or re-typed array
+    never collides with the original.
+    """
+    h = hashlib.sha256()
+    for arr in arrays:
+        arr = np.ascontiguousarray(arr)
+        h.update(str((arr.shape, arr.dtype.str)).encode())
+        h.update(arr.tobytes())
+    if params is not None:
+        h.update(json.dumps(params, sort_keys=True, default=str).encode())
+    return h.hexdigest()
+
+
+def _save_array(path, arr):
+    # np.save appends '.npy' to plain paths, so write through a file handle
+    with open(path, 'wb') as f:
+        np.save(f, arr)
+
+
+class ModelCache:
+    """
+    Size-bounded on-disk cache of fitted fold models and their predictions.
+
+    Parameters:
+    -----------
+    cache_dir : str - Directory for cached artifacts (created if missing)
+    max_bytes : int - Total size limit; least recently used files are evicted
+    """
+
+    def __init__(self, cache_dir='.model_cache', max_bytes=2 * 1024 ** 3):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def __repr__(self):
+        return (f'ModelCache({self.cache_dir!r}, hits={self.hits}, misses={self.misses}, '
+                f'{self.size_bytes() / 1024 ** 2:.1f} MiB)')
+
+    # -------------------------------------------------------------------------
+    # Keys & paths
+    # -------------------------------------------------------------------------
+
+    @staticmethod
+    def model_key(X_train, y_train, model_params):
+        params = {k: v for k, v in model_params.items() if k not in _NON_MODEL_PARAMS}
+        params['sklearn_version'] = sklearn.__version__
+        return hash_arrays(X_train, y_train, params=params)
+
+    def _path(self, name):
+        return os.path.join(self.cache_dir, name)
+
+    def _model_path(self, key):
+        return self._path(f'{key}.model.joblib')
+
+    def _probs_path(self, key, test_key):
+        return self._path(f'{key}.{test_key[:16]}.probs.npy')
+
+    # -------------------------------------------------------------------------
+    # Storage
+    # -------------------------------------------------------------------------
+
+    def _touch(self, path):
+        try:
+            os.utime(path, None)
+        except FileNotFoundError:
+            pass
+
+    def _atomic_write(self, path, write_fn):
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        os.close(fd)
+        try:
+            write_fn(tmp)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.tmp'):
+                continue
+            path = self._path(name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                # Evicted by another process sharing the directory
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def size_bytes(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        """Delete least recently used files until the cache fits in max_bytes."""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    def clear(self):
+        for _, _, path in self._entries():
+            self._remove(path)
+
+    # -------------------------------------------------------------------------
+    # Fit / predict
+    # -------------------------------------------------------------------------
+
+    def fit_predict(self, X_train, y_train, X_test, model_params=None,
+                    model_cls=RandomForestClassifier):
+        """
+        Out-of-fold P(class 1) for X_test, fitting only on a cache miss.
+
+        Lookup order: cached probabilities -> cached model (predict only)
+        -> fit, predict and store both.
+
+        Returns:
+        --------
+        ndarray : Probability of the positive class for each row of X_test
+        """
+        model_params = RF_PARAMS if model_params is None else model_params
+        X_train = np.asarray(X_train, dtype=np.float64)
+        y_train = np.asarray(y_train)
+        X_test = np.asarray(X_test, dtype=np.float64)
+
+        key = self.model_key(X_train, y_train, dict(model_params, model_cls=model_cls.__name__))
+        probs_path = self._probs_path(key, hash_arrays(X_test))
+        model_path = self._model_path(key)
+
+        try:
+            probs = np.load(probs_path)
+        except FileNotFoundError:
+            pass
+        else:
+            self.hits += 1
+            self._touch(probs_path)
+            self._touch(model_path)
+            return probs
+
+        model = self._fit_or_load(key, X_train, y_train, model_params, model_cls)
+
+        if hasattr(model, 'predict_proba'):
+            probs = model.predict_proba(X_test)[:, 1]
+        else:
+            probs = model.predict(X_test)
+
+        self._atomic_write(probs_path, lambda p: _save_array(p, probs))
+        self.evict()
+        return probs
+
+    def _fit_or_load(self, key, X_train, y_train, model_params, model_cls):
+        model_path = self._model_path(key)
+        try:
+            model = joblib.load(model_path)
+        except FileNotFoundError:
+            pass
+        else:
+            self.hits += 1
+            self._touch(model_path)
+            return model
+
+        self.misses += 1
+        model = model_cls(**model_params)
+        model.fit(X_train, y_train)
+        self._atomic_write(model_path, lambda p: joblib.dump(model, p))
+        return model
+
+    def fit(self, X_train, y_train, model_params=None, model_cls=RandomForestClassifier):
+        """Fitted model for this training set, loaded from disk when cached."""
+        model_params = RF_PARAMS if model_params is None else model_params
+        X_train = np.asarray(X_train, dtype=np.float64)
+        y_train = np.asarray(y_train)
+        key = self.model_key(X_train, y_train, dict(model_params, model_cls=model_cls.__name__))
+        model = self._fit_or_load(key, X_train, y_train, model_params, model_cls)
+        self.evict()
+        return model
+
+    def load_model(self, X_train, y_train, model_params=None, model_cls=RandomForestClassifier):
+        """Return the cached fitted model for this training set, or None."""
+        model_params = RF_PARAMS if model_params is None else model_params
+        key = self.model_key(
+            np.asarray(X_train, dtype=np.float64), np.asarray(y_train),
+            dict(model_params, model_cls=model_cls.__name__),
+        )
+        path = self._model_path(key)
+        try:
+            model = joblib.load(path)
+        except FileNotFoundError:
+            return None
+        self._touch(path)
+        return model
+
+
+# =============================================================================
+# CACHED WALK-FORWARD LOOP
+# =============================================================================
+
+def walk_forward_folds(df, feature_cols, target_fn,
+                       min_train_days=252, retrain_freq=63,
+                       embargo_days=30, forward_window=30):
+    """
+    Yield the trainable folds of the backtest_with_ml walk-forward loop.
+
+    Applies the same embargo, minimum-sample and class-balance skips as
+    STEP 3 of backtest_with_ml.
+
+    Yields:
+    -------
+    dict with 'test_start', 'test_end' (positions in df), 'X_train',
+    'y_train' and 'X_test' (features with NaNs filled by 0)
+    """
+    features = df[feature_cols].fillna(0).to_numpy()
+
+    for train_end in range(min_train_days, len(df), retrain_freq):
+        train_end_with_embargo = train_end - embargo_days
+        test_start = train_end
+        test_end = min(train_end + retrain_freq, len(df))
+
+        if train_end_with_embargo < min_train_days // 2:
+            continue
+
+        target = target_fn(df, train_end_with_embargo, forward_window).iloc[:train_end_with_embargo]
+        valid = target.notna().to_numpy()
+
+        if valid.sum() < 50:
+            continue
+
+        X_train = features[:train_end_with_embargo][valid]
+        y_train = target.to_numpy()[valid].astype(int)
+
+        if len(np.unique(y_train)) < 2:
+            continue
+
+        X_test = features[test_start:test_end]
+        if len(X_test) == 0:
+            continue
+
+        yield {
+            'test_start': test_start,
+            'test_end': test_end,
+            'X_train': X_train,
+            'y_train': y_train,
+            'X_test': X_test,
+        }
+
+
+def walk_forward_probabilities(df, feature_cols, target_fn, cache=None,
+                               min_train_days=252, retrain_freq=63,
+                               embargo_days=30, forward_window=30,
+                               model_params=None):
+    """
+    Walk-forward ML probabilities identical to STEP 3 of backtest_with_ml,
+    with every fold fit routed through a ModelCache.
+
+    Parameters:
+    -----------
+    df : DataFrame - Output of engineer_features
+    feature_cols : list - Output of get_feature_columns
+    target_fn : callable - create_target_no_lookahead(df, train_end_idx, forward_window)
+    cache : ModelCache - Cache to use (default: no caching)
+    min_train_days, retrain_freq, embargo_days, forward_window : int - As in backtest_with_ml
+    model_params : dict - Classifier parameters (default: RF_PARAMS)
+
+    Returns:
+    --------
+    Series : ml_prob on df.index (0.5 where no model was available)
+    """
+    model_params = RF_PARAMS if model_params is None else model_params
+    ml_probs = pd.Series(0.5, index=df.index)
+
+    folds = walk_forward_folds(df, feature_cols, target_fn, min_train_days,
+                               retrain_freq, embargo_days, forward_window)
+    for fold in folds:
+        if cache is not None:
+            probs = cache.fit_predict(fold['X_train'], fold['y_train'], fold['X_test'], model_params)
+        else:
+            model = RandomForestClassifier(**model_params)
+            model.fit(fold['X_train'], fold['y_train'])
+            probs = model.predict_proba(fold['X_test'])[:, 1]
+
+        ml_probs.iloc[fold['test_start']:fold['test_end']] = probs
+
+    return ml_probs
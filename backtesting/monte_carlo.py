@@ -0,0 +1,304 @@
+"""
+Batched Monte Carlo path simulator for robustness and capacity testing.
+
+Every notebook evaluates the strategy on one realized 2015-2025 history
+per pair. This module fits a simple generative model to a pair's basket
+returns and re-runs the baseline volatility-dispersion rules on thousands
+of synthetic histories to get distributions of Sharpe, drawdown and trade
+counts instead of single numbers.
+
+Generative model (per pair):
+    - VIX regimes (calm / normal / stressed by VIX level) follow a Markov
+      chain fitted from the daily VIX regime sequence
+    - within a regime, (ret_long, ret_short) are bivariate normal with the
+      regime's mean and covariance, so both volatility and correlation
+      switch with VIX
+
+Paths are simulated as one (paths x bars x 2) array per chunk and the
+signal, position and cost logic of backtest_with_ml (baseline rules) runs
+on all paths of a chunk at once. Chunks bound memory and can be spread
+across a process pool.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+
+TRADING_DAYS = 252
+
+# VIX levels separating calm / normal / stressed regimes
+VIX_REGIME_THRESHOLDS = (20, 30)
+
+
+# =============================================================================
+# MODEL FITTING
+# =============================================================================
+
+def vix_regimes(vix, thresholds=VIX_REGIME_THRESHOLDS):
+    """Regime label per day: 0 below thresholds[0], 1 between, ..., len(thresholds) above."""
+    return np.searchsorted(np.asarray(thresholds), np.asarray(vix, dtype=float), side='right')
+
+
+def fit_regime_model(df, vix_series, thresholds=VIX_REGIME_THRESHOLDS, transition_prior=1e-3):
+    """
+    Fit the regime-switching bivariate return model for one pair.
+
+    Parameters:
+    -----------
+    df : DataFrame - Output of calculate_volatility_metrics (needs ret_long, ret_short)
+    vix_series : Series - VIX close
+    thresholds : tuple - VIX levels separating the regimes
+    transition_prior : float - Pseudo-count added to every transition between
+                       observed regimes, so a regime with few exits still
+                       has a valid row; never-observed regimes stay unreachable
+
+    Returns:
+    --------
+    dict with
+        'thresholds' : tuple
+        'mu'    : ndarray (regimes x 2) - Mean daily (ret_long, ret_short)
+        'chol'  : ndarray (regimes x 2 x 2) - Cholesky factor of each covariance
+        'trans' : ndarray (regimes x regimes) - Daily regime transition matrix
+        'init'  : ndarray (regimes) - Unconditional regime frequencies
+    """
+    vix_aligned = vix_series.reindex(df.index, method='ffill').bfill()
+    regime = vix_regimes(vix_aligned, thresholds)
+    returns = df[['ret_long', 'ret_short']].to_numpy(dtype=float)
+    n_regimes = len(thresholds) + 1
+
+    overall_cov = np.cov(returns, rowvar=False)
+    mu = np.zeros((n_regimes, 2))
+    chol = np.zeros((n_regimes, 2, 2))
+
+    for r in range(n_regimes):
+        rets = returns[regime == r]
+        # Fall back to the full-sample estimate for regimes that barely occur
+        if len(rets) < 30:
+            mu[r] = returns.mean(axis=0)
+            cov = overall_cov
+        else:
+            mu[r] = rets.mean(axis=0)
+            cov = np.cov(rets, rowvar=False)
+        chol[r] = np.linalg.cholesky(cov + 1e-12 * np.eye(2))
+
+    # Transition counts with a small prior between observed regimes only
+    observed = np.bincount(regime, minlength=n_regimes) > 0
+    counts = np.zeros((n_regimes, n_regimes))
+    counts[np.ix_(observed, observed)] = transition_prior
+    np.add.at(counts, (regime[:-1], regime[1:]), 1)
+    # Rows of unobserved regimes are never used; a self-loop keeps them valid
+    counts[~observed, ~observed] = 1.0
+    trans = counts / counts.sum(axis=1, keepdims=True)
+
+    init = np.bincount(regime, minlength=n_regimes) / len(regime)
+
+    return {
+        'thresholds': tuple(thresholds),
+        'mu': mu,
+        'chol': chol,
+        'trans': trans,
+        'init': init,
+    }
+
+
+# =============================================================================
+# PATH SIMULATION
+# =============================================================================
+
+def simulate_paths(model, n_paths, n_bars, rng):
+    """
+    Simulate basket return paths.
+
+    Returns:
+    --------
+    returns : ndarray (n_paths x n_bars x 2) - Daily (ret_long, ret_short)
+    regimes : ndarray[int8] (n_paths x n_bars) - Regime of each bar
+    """
+    trans_cdf = np.cumsum(model['trans'], axis=1)
+    trans_cdf[:, -1] = 1.0
+    n_regimes = len(model['init'])
+
+    regimes = np.empty((n_paths, n_bars), dtype=np.int8)
+    init_cdf = np.cumsum(model['init'])
+    regimes[:, 0] = np.minimum(np.searchsorted(init_cdf, rng.random(n_paths)), n_regimes - 1)
+
+    # Markov chain: one vectorized draw per bar across all paths
+    u = rng.random((n_paths, n_bars))
+    for t in range(1, n_bars):
+        cdf = trans_cdf[regimes[:, t - 1]]
+        regimes[:, t] = (u[:, t, None] > cdf).sum(axis=1)
+
+    z = rng.standard_normal((n_paths, n_bars, 2))
+    returns = model['mu'][regimes] + np.einsum('ptij,ptj->pti', model['chol'][regimes], z)
+
+    # Keep basket returns above -100%
+    np.maximum(returns, -0.99, out=returns)
+
+    return returns, regimes
+
+
+# =============================================================================
+# VECTORIZED STRATEGY OVER PATHS
+# =============================================================================
+
+def _rolling_mean_std(x, window):
+    """Trailing mean and sample std along axis 1 of a (paths x bars) array."""
+    n_paths, n_bars = x.shape
+    mean = np.full((n_paths, n_bars), np.nan)
+    std = np.full((n_paths, n_bars), np.nan)
+    if n_bars < window:
+        return mean, std
+
+    # Demean per path before the cumulative sums to limit cancellation
+    shift = np.nanmean(x, axis=1, keepdims=True)
+    xc = np.nan_to_num(x - shift)
+    c1 = np.zeros((n_paths, n_bars + 1))
+    c2 = np.zeros((n_paths, n_bars + 1))
+    np.cumsum(xc, axis=1, out=c1[:, 1:])
+    np.cumsum(xc * xc, axis=1, out=c2[:, 1:])
+
+    s1 = c1[:, window:] - c1[:, :-window]
+    s2 = c2[:, window:] - c2[:, :-window]
+    mean[:, window - 1:] = s1 / window + shift
+    std[:, window - 1:] = np.sqrt(np.maximum(s2 - s1 * s1 / window, 0.0) / (window - 1))
+
+    # Windows that reach into NaN warm-up bars are undefined
+    valid = np.isfinite(x)
+    nan_count = np.zeros((n_paths, n_bars + 1))
+    np.cumsum(~valid, axis=1, out=nan_count[:, 1:])
+    has_nan = (nan_count[:, window:] - nan_count[:, :-window]) > 0
+    mean[:, window - 1:][has_nan] = np.nan
+    std[:, window - 1:][has_nan] = np.nan
+
+    return mean, std
+
+
+def run_strategy_paths(returns, vol_lookback=20, z_lookback=120,
+                       z_entry=2.0, z_exit=0.5, tc_per_side=0.0005):
+    """
+    Baseline volatility-dispersion rules on every simulated path at once.
+
+    Mirrors calculate_volatility_metrics + the baseline position logic of
+    backtest_with_ml: the loop is over bars only, each step updates all paths.
+
+    Parameters:
+    -----------
+    returns : ndarray (paths x bars x 2) - Simulated (ret_long, ret_short)
+
+    Returns:
+    --------
+    dict of ndarray (paths) : sharpe_ratio, ann_return, ann_volatility,
+                              max_drawdown, num_trades,
+                              num_position_changes
+    """
+    ret_long = returns[:, :, 0]
+    ret_short = returns[:, :, 1]
+
+    _, vol_long = _rolling_mean_std(ret_long, vol_lookback)
+    _, vol_short = _rolling_mean_std(ret_short, vol_lookback)
+    vol_spread = (vol_long - vol_short) * np.sqrt(TRADING_DAYS)
+
+    vol_mu, vol_sig = _rolling_mean_std(vol_spread, z_lookback)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        vol_z = (vol_spread - vol_mu) / vol_sig
+
+    # Same warm-up trim as the dropna() in calculate_volatility_metrics
+    start = vol_lookback + z_lookback - 2
+    vol_z = vol_z[:, start:]
+    spread_ret = (ret_long - ret_short)[:, start:]
+    n_paths, n_bars = vol_z.shape
+
+    pos = np.zeros((n_paths, n_bars), dtype=np.int8)
+    for t in range(1, n_bars):
+        prev = pos[:, t - 1]
+        z_now = vol_z[:, t]
+        flat = prev == 0
+        enter = np.where(z_now > z_entry, -1, np.where(z_now < -z_entry, 1, 0))
+        hold = np.where(np.abs(z_now) < z_exit, 0, prev)
+        pos[:, t] = np.where(flat, enter, hold)
+
+    pnl = np.zeros((n_paths, n_bars))
+    pnl[:, 1:] = pos[:, :-1] * spread_ret[:, 1:]
+    turnover = np.zeros((n_paths, n_bars))
+    turnover[:, 1:] = np.abs(np.diff(pos.astype(np.int16), axis=1))
+    ret_net = pnl - turnover * (2 * tc_per_side)
+
+    ann_return = ret_net.mean(axis=1) * TRADING_DAYS
+    ann_vol = ret_net.std(axis=1, ddof=1) * np.sqrt(TRADING_DAYS)
+    equity = np.cumprod(1 + ret_net, axis=1)
+    max_dd = (equity / np.maximum.accumulate(equity, axis=1)).min(axis=1) - 1
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sharpe = np.where(ann_vol > 0, ann_return / ann_vol, 0.0)
+
+    return {
+        'sharpe_ratio': sharpe,
+        'ann_return': ann_return,
+        'ann_volatility': ann_vol,
+        'max_drawdown': max_dd,
+        # Round trips, counted at entry (the rules always exit before reversing)
+        'num_trades': ((pos[:, 1:] != 0) & (pos[:, :-1] == 0)).sum(axis=1),
+        # What the notebook tables call num_trades: (pos.diff().abs() > 0).sum()
+        'num_position_changes': (turnover > 0).sum(axis=1),
+    }
+
+
+# =============================================================================
+# CHUNKED / PARALLEL DRIVER
+# =============================================================================
+
+def _simulate_chunk(model, n_paths, n_bars, seed_seq, strategy_kwargs):
+    rng = np.random.default_rng(seed_seq)
+    returns, _ = simulate_paths(model, n_paths, n_bars, rng)
+    return run_strategy_paths(returns, **strategy_kwargs)
+
+
+def monte_carlo(model, n_paths=10000, n_bars=2520, chunk_size=500,
+                n_jobs=1, seed=42, **strategy_kwargs):
+    """
+    Distribution of strategy metrics over simulated histories.
+
+    Parameters:
+    -----------
+    model : dict - Output of fit_regime_model
+    n_paths : int - Number of synthetic paths
+    n_bars : int - Bars per path, including the signal warm-up (default: ~10 years)
+    chunk_size : int - Paths simulated and evaluated together; peak memory is
+                 roughly chunk_size * n_bars * 150 bytes
+    n_jobs : int - Worker processes (1 = in-process, -1 = all cores)
+    seed : int - Base seed; each chunk gets an independent child stream
+    **strategy_kwargs : Passed to run_strategy_paths (z_entry, z_exit, ...)
+
+    Returns:
+    --------
+    DataFrame : One row per path with sharpe_ratio, ann_return,
+                ann_volatility, max_drawdown, num_trades (round trips) and
+                num_position_changes (entries plus exits, the notebook's count)
+    """
+    if n_paths <= 0:
+        raise ValueError(f'n_paths must be positive, got {n_paths}')
+    if chunk_size <= 0:
+        raise ValueError(f'chunk_size must be positive, got {chunk_size}')
+
+    sizes = [min(chunk_size, n_paths - lo) for lo in range(0, n_paths, chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+
+    if n_jobs == -1:
+        n_jobs = os.cpu_count() or 1
+
+    args = ([model] * len(sizes), sizes, [n_bars] * len(sizes), seeds,
+            [strategy_kwargs] * len(sizes))
+
+    if n_jobs <= 1:
+        parts = list(map(_simulate_chunk, *args))
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            parts = list(pool.map(_simulate_chunk, *args))
+
+    return pd.DataFrame({
+        metric: np.concatenate([part[metric] for part in parts])
+        for metric in parts[0]
+    })
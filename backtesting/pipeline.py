@@ -0,0 +1,342 @@
+"""
+Dependency-tracked pipeline DAG that reruns only stages affected by a change.
+
+Changing one constant in the notebook config cell (Z_EXIT,
+ML_EMBARGO_DAYS, ...) currently means rerunning everything: downloads,
+stat tests, feature engineering, every walk-forward fit, baselines and
+charts. Here the pipeline is a DAG of stages. Each stage declares its
+upstream stages and the config keys it reads, and is either global or fanned
+out per pair.
+
+Every (stage, pair) unit gets a fingerprint built from its config values,
+its pair definition (all of PAIRS for a global stage), the source of its
+function and the fingerprints of its inputs. On a rerun, units whose fingerprint is unchanged are skipped
+and their previous output is reused, so a parameter tweak only reruns the
+stages downstream of it. Independent units (different pairs, parallel
+branches) run concurrently on a thread pool; numpy, pandas and sklearn
+release the GIL for the heavy work, and notebook-defined functions do not
+need to be picklable.
+
+Only the source of the stage function itself is hashed, not the helpers it
+calls. A stage wrapper around engineer_features is not invalidated when
+engineer_features is edited unless the helper is listed in the stage's
+code_deps (or the stage is passed in force=).
+"""
+
+import hashlib
+import inspect
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import joblib
+import pandas as pd
+
+
+# =============================================================================
+# STAGES
+# =============================================================================
+
+class Stage:
+    """
+    One node of the pipeline.
+
+    Parameters:
+    -----------
+    name : str - Unique stage name
+    fn : callable - Global stage:   fn(pairs, inputs, params)
+                    Per-pair stage: fn(pair_name, pair_def, inputs, params)
+                    `inputs` maps each dependency name to its output; a
+                    per-pair dependency of a global stage arrives as a
+                    dict {pair_name: output}
+    deps : list - Names of upstream stages
+    params : list - Config keys the stage reads (passed in `params`)
+    per_pair : bool - Run once per pair instead of once overall
+    code_deps : list - Helper functions fn calls (e.g. engineer_features);
+                their source is part of the fingerprint
+    """
+
+    def __init__(self, name, fn, deps=(), params=(), per_pair=False, code_deps=()):
+        self.name = name
+        self.fn = fn
+        self.deps = list(deps)
+        self.params = list(params)
+        self.per_pair = per_pair
+        self.code_deps = list(code_deps)
+
+    def __repr__(self):
+        kind = 'per-pair' if self.per_pair else 'global'
+        return f'Stage({self.name!r}, {kind}, deps={self.deps}, params={self.params})'
+
+
+def _code_fingerprint(fn):
+    """Hash of a function's source (bytecode if the source is unavailable)."""
+    try:
+        src = inspect.getsource(fn).encode()
+    except (OSError, TypeError):
+        src = getattr(getattr(fn, '__code__', None), 'co_code', repr(fn).encode())
+    return hashlib.sha256(src).hexdigest()
+
+
+def _hash(payload):
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+# =============================================================================
+# PIPELINE
+# =============================================================================
+
+class Pipeline:
+    """
+    DAG scheduler with fingerprint-based invalidation.
+
+    Parameters:
+    -----------
+    stages : list of Stage - In any order; dependencies are resolved by name
+    max_workers : int - Threads for concurrent units (default: os.cpu_count())
+    cache_dir : str - Persist outputs across kernel restarts (default: memory only)
+    """
+
+    def __init__(self, stages, max_workers=None, cache_dir=None):
+        self.stages = {stage.name: stage for stage in stages}
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.cache_dir = cache_dir
+        self.results = {}       # (stage, pair) -> output
+        self._fingerprints = {}  # (stage, pair) -> fingerprint of the stored output
+        self.report = pd.DataFrame(columns=['stage', 'pair', 'status', 'seconds'])
+
+        for stage in stages:
+            for dep in stage.deps:
+                if dep not in self.stages:
+                    raise ValueError(f'Stage {stage.name!r} depends on unknown stage {dep!r}')
+        self.order = self._topological_order()
+
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def _topological_order(self):
+        order, state = [], {}
+
+        def visit(name):
+            if state.get(name) == 'done':
+                return
+            if state.get(name) == 'active':
+                raise ValueError(f'Cycle in pipeline at stage {name!r}')
+            state[name] = 'active'
+            for dep in self.stages[name].deps:
+                visit(dep)
+            state[name] = 'done'
+            order.append(name)
+
+        for name in self.stages:
+            visit(name)
+        return order
+
+    # -------------------------------------------------------------------------
+    # Units & fingerprints
+    # -------------------------------------------------------------------------
+
+    def _units(self, pairs):
+        """(stage, pair) units in topological order with their upstream units."""
+        units = {}
+        for name in self.order:
+            stage = self.stages[name]
+            for pair in (pairs if stage.per_pair else [None]):
+                upstream = []
+                for dep in stage.deps:
+                    if not self.stages[dep].per_pair:
+                        upstream.append((dep, None))
+                    elif stage.per_pair:
+                        upstream.append((dep, pair))
+                    else:
+                        upstream.extend((dep, p) for p in pairs)
+                units[(name, pair)] = upstream
+        return units
+
+    def _fingerprint(self, unit, upstream, config, pairs, fingerprints):
+        name, pair = unit
+        stage = self.stages[name]
+        return _hash({
+            'stage': name,
+            'code': [_code_fingerprint(fn) for fn in [stage.fn] + stage.code_deps],
+            'params': {key: config[key] for key in stage.params},
+            # A global stage sees every pair, so any PAIRS edit invalidates it
+            'pair': [pair, pairs[pair]] if pair is not None else pairs,
+            'upstream': [fingerprints[u] for u in upstream],
+        })
+
+    def _cache_path(self, fingerprint):
+        return os.path.join(self.cache_dir, f'{fingerprint}.joblib')
+
+    def _lookup(self, unit, fingerprint):
+        """Previous output for this exact fingerprint, or (False, None)."""
+        if self._fingerprints.get(unit) == fingerprint:
+            return True, self.results[unit]
+        if self.cache_dir is not None and os.path.exists(self._cache_path(fingerprint)):
+            return True, joblib.load(self._cache_path(fingerprint))
+        return False, None
+
+    def _call(self, unit, upstream, config, pairs, outputs):
+        name, pair = unit
+        stage = self.stages[name]
+        params = {key: config[key] for key in stage.params}
+
+        inputs = {}
+        for dep in stage.deps:
+            if self.stages[dep].per_pair and not stage.per_pair:
+                inputs[dep] = {p: outputs[(dep, p)] for p in pairs}
+            else:
+                inputs[dep] = outputs[(dep, pair if self.stages[dep].per_pair else None)]
+
+        start = time.perf_counter()
+        try:
+            if stage.per_pair:
+                result = stage.fn(pair, pairs[pair], inputs, params)
+            else:
+                result = stage.fn(pairs, inputs, params)
+        except Exception as exc:
+            where = f' for pair {pair!r}' if pair is not None else ''
+            raise RuntimeError(f'Stage {name!r} failed{where}') from exc
+        return result, time.perf_counter() - start
+
+    # -------------------------------------------------------------------------
+    # Run
+    # -------------------------------------------------------------------------
+
+    def run(self, config, pairs, targets=None, force=()):
+        """
+        Run the pipeline, skipping every unit whose inputs are unchanged.
+
+        Parameters:
+        -----------
+        config : dict - Config values (e.g. {'Z_EXIT': Z_EXIT, ...})
+        pairs : dict - PAIRS definition used to fan out per-pair stages
+        targets : list - Only run these stages and their ancestors (default: all)
+        force : list - Stage names to rerun even if unchanged
+
+        Returns:
+        --------
+        dict : (stage, pair) -> output (pair is None for global stages);
+               self.report holds one row per unit with status 'ran' or 'skipped'
+        """
+        units = self._units(list(pairs))
+        if targets is not None:
+            units = self._restrict(units, targets)
+
+        missing = {key for (name, _) in units for key in self.stages[name].params} - set(config)
+        if missing:
+            raise KeyError(f'Config is missing keys: {sorted(missing)}')
+
+        fingerprints, outputs, report = {}, {}, []
+        pending = dict(units)
+        running = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while pending or running:
+                # Resolve every unit whose upstream units are finished
+                for unit in [u for u, ups in pending.items() if all(x in outputs for x in ups)]:
+                    upstream = pending.pop(unit)
+                    fp = self._fingerprint(unit, upstream, config, pairs, fingerprints)
+                    fingerprints[unit] = fp
+
+                    found, cached = (False, None) if unit[0] in force else self._lookup(unit, fp)
+                    if found:
+                        outputs[unit] = cached
+                        report.append({'stage': unit[0], 'pair': unit[1],
+                                       'status': 'skipped', 'seconds': 0.0})
+                    else:
+                        future = pool.submit(self._call, unit, upstream, config, pairs, outputs)
+                        running[future] = unit
+
+                if not running:
+                    if pending:
+                        # Skips may have unblocked more units; loop again
+                        continue
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    unit = running.pop(future)
+                    result, seconds = future.result()
+                    outputs[unit] = result
+                    report.append({'stage': unit[0], 'pair': unit[1],
+                                   'status': 'ran', 'seconds': seconds})
+                    if self.cache_dir is not None:
+                        joblib.dump(result, self._cache_path(fingerprints[unit]))
+
+        self.results.update(outputs)
+        self._fingerprints.update(fingerprints)
+        self.report = pd.DataFrame(report, columns=['stage', 'pair', 'status', 'seconds'])
+        return outputs
+
+    def _restrict(self, units, targets):
+        keep, stack = set(), [u for u in units if u[0] in targets]
+        while stack:
+            unit = stack.pop()
+            if unit not in keep:
+                keep.add(unit)
+                stack.extend(units[unit])
+        return {u: ups for u, ups in units.items() if u in keep}
+
+    def summary(self):
+        """Ran / skipped counts and time per stage for the last run."""
+        if self.report.empty:
+            return self.report
+        return (self.report
+                .groupby('stage', sort=False)
+                .agg(ran=('status', lambda s: (s == 'ran').sum()),
+                     skipped=('status', lambda s: (s == 'skipped').sum()),
+                     seconds=('seconds', 'sum')))
+
+
+# =============================================================================
+# v4 NOTEBOOK LAYOUT
+# =============================================================================
+
+# Stage graph of v4_Volatility_Dispersion_ML_Enhanced_V2, with the config
+# keys each stage reads. create_target_no_lookahead uses the Z_ENTRY / Z_EXIT
+# globals, so targets (and the folds after them) depend on both thresholds.
+V4_STAGE_SPEC = [
+    # name,           deps,                          params,                                   per_pair
+    ('data',          [],                             ['START_DATE', 'END_DATE'],                False),
+    ('basket_metrics', ['data'],                      ['VOL_LOOKBACK', 'Z_LOOKBACK'],           True),
+    ('stat_tests',    ['basket_metrics'],             ['TRAIN_END_DATE'],                       True),
+    ('features',      ['basket_metrics', 'data'],     [],                                       True),
+    ('targets',       ['features'],                   ['Z_ENTRY', 'Z_EXIT', 'ML_FORWARD_WINDOW',
+                                                       'ML_MIN_TRAIN_DAYS', 'ML_RETRAIN_FREQ',
+                                                       'ML_EMBARGO_DAYS'],                      True),
+    ('model_folds',   ['features', 'targets'],        ['ML_MIN_TRAIN_DAYS', 'ML_RETRAIN_FREQ',
+                                                       'ML_EMBARGO_DAYS'],                      True),
+    ('positions',     ['features', 'model_folds'],    ['Z_ENTRY', 'Z_EXIT', 'ML_PROB_THRESHOLD',
+                                                       'TC_PER_SIDE'],                          True),
+    ('metrics',       ['positions', 'stat_tests', 'data'], ['TRAIN_END_DATE'],                  False),
+    ('charts',        ['metrics', 'positions'],       ['TRAIN_END_DATE'],                       False),
+    ('deck',          ['charts', 'metrics'],          [],                                       False),
+]
+
+
+def build_v4_pipeline(stage_fns, max_workers=None, cache_dir=None, code_deps=None):
+    """
+    Wire notebook functions into the v4 stage graph.
+
+    Parameters:
+    -----------
+    stage_fns : dict - Stage name -> callable with the Stage signature;
+                stages missing from the dict (e.g. 'deck') are left out
+                together with everything downstream of them
+    code_deps : dict - Stage name -> helper functions to fingerprint, e.g.
+                {'features': [engineer_features, calculate_vix_features]}
+
+    Returns:
+    --------
+    Pipeline
+    """
+    code_deps = code_deps or {}
+    stages, available = [], set()
+    for name, deps, params, per_pair in V4_STAGE_SPEC:
+        if name in stage_fns and all(dep in available for dep in deps):
+            stages.append(Stage(name, stage_fns[name], deps, params, per_pair,
+                                code_deps.get(name, ())))
+            available.add(name)
+    return Pipeline(stages, max_workers=max_workers, cache_dir=cache_dir)
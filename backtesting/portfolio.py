@@ -0,0 +1,284 @@
+"""
+Multi-pair portfolio construction with incremental risk-based weighting.
+
+The notebooks combine pairs with all_returns.mean(axis=1), i.e. a fixed
+equal-weight portfolio with no regard for each pair's volatility or the
+correlation between Semiconductors, Energy, Tech_Broad_vs_Mega and
+Staples_vs_Discretionary. This module allocates across the per-pair
+ret_net series using an EWMA covariance matrix that is updated with one
+rank-one step per bar rather than re-estimated over a rolling window:
+
+    cov_t = lam * cov_{t-1} + (1 - lam) * r_t r_t'
+
+Supported weightings: equal, inverse-vol and risk-parity, each optionally
+scaled to a volatility target. Rebalancing is turnover-aware: weights only
+move when the target drifts outside a no-trade band, and every move is
+charged a cost per unit of turnover.
+
+Timing follows backtest_with_ml: weights set on the close of bar t use
+data through t and earn the pair returns of bar t+1.
+"""
+
+import warnings
+
+import numpy as np
+import pandas as pd
+
+
+TRADING_DAYS = 252
+
+
+# =============================================================================
+# INCREMENTAL EWMA COVARIANCE
+# =============================================================================
+
+class EWMACovariance:
+    """
+    Exponentially weighted covariance with O(n^2) rank-one updates.
+
+    Returns are treated as zero-mean, the usual choice for daily risk
+    models (RiskMetrics). A NaN return means the asset was not observed on
+    that bar: its rows and columns are left untouched, so a pair that starts
+    late (or pauses) is not credited with a run of zero returns. Each entry
+    keeps its own EWMA weight for the start-up bias correction.
+
+    Parameters:
+    -----------
+    n_assets : int - Number of return streams
+    halflife : float - Half-life in bars (lam = 0.5 ** (1 / halflife))
+    """
+
+    def __init__(self, n_assets, halflife=60):
+        self.lam = 0.5 ** (1.0 / halflife)
+        self.cov = np.zeros((n_assets, n_assets))
+        self.n_updates = np.zeros(n_assets, dtype=int)  # Observed bars per asset
+        self._weight = np.zeros((n_assets, n_assets))   # Sum of EWMA weights per entry
+
+    def update(self, r):
+        """Fold one bar of returns into the estimate (in place)."""
+        r = np.asarray(r, dtype=np.float64)
+        seen = ~np.isnan(r)
+        if seen.all():
+            self.cov *= self.lam
+            self.cov += (1 - self.lam) * np.outer(r, r)
+            self._weight *= self.lam
+            self._weight += 1 - self.lam
+        elif seen.any():
+            both = np.ix_(seen, seen)
+            r_seen = r[seen]
+            self.cov[both] = self.lam * self.cov[both] + (1 - self.lam) * np.outer(r_seen, r_seen)
+            self._weight[both] = self.lam * self._weight[both] + (1 - self.lam)
+        self.n_updates += seen
+
+    @property
+    def bias_correction(self):
+        """Per-entry factor turning the raw EWMA sums into averages (0 if never observed)."""
+        return np.where(self._weight > 0, 1.0 / np.where(self._weight > 0, self._weight, 1.0), 0.0)
+
+    @property
+    def covariance(self):
+        """Bias-corrected covariance (a new array)."""
+        return self.cov * self.bias_correction
+
+    @property
+    def volatility(self):
+        return np.sqrt(np.maximum(np.diag(self.covariance), 0.0))
+
+
+# =============================================================================
+# WEIGHTING SCHEMES
+# =============================================================================
+
+def equal_weights(cov):
+    n = len(cov)
+    return np.full(n, 1.0 / n)
+
+
+def inverse_vol_weights(cov):
+    """Weights proportional to 1 / volatility (zero-vol assets get no weight)."""
+    vol = np.sqrt(np.maximum(np.diag(cov), 0.0))
+    inv = np.where(vol > 0, 1.0 / np.where(vol > 0, vol, 1.0), 0.0)
+    total = inv.sum()
+    return inv / total if total > 0 else equal_weights(cov)
+
+
+def risk_parity_weights(cov, w0=None, max_iter=100, tol=1e-6):
+    """
+    Long-only equal-risk-contribution weights.
+
+    Minimizes 0.5 * y' cov y - mean(log y) with a damped Newton method and
+    normalizes w = y / sum(y); at the optimum every y_i * (cov @ y)_i equals
+    1/n. Warm-starting from the previous bar's solution usually converges in
+    one or two steps. Assets with zero variance get no weight.
+
+    Parameters:
+    -----------
+    cov : ndarray - Covariance matrix (any positive scale)
+    w0 : ndarray - Starting weights (default: inverse-vol)
+    max_iter : int - Newton iterations before giving up (with a warning)
+    tol : float - Max relative deviation of risk contributions from equal
+    """
+    n_all = len(cov)
+    active = np.diag(cov) > 0
+    if not active.any():
+        return equal_weights(cov)
+
+    idx = np.flatnonzero(active)
+    sigma = cov[np.ix_(idx, idx)]
+    n = len(idx)
+
+    # Weights are scale-invariant: work at unit average variance for numerical
+    # headroom, plus a tiny ridge for rank-deficient EWMA matrices
+    sigma = sigma / (np.trace(sigma) / n) + 1e-10 * np.eye(n)
+
+    y = inverse_vol_weights(sigma) if w0 is None else np.asarray(w0, dtype=float)[idx]
+    y = np.where(y > 0, y, 1.0 / n)
+    y = y / np.sqrt(y @ sigma @ y)
+
+    converged = False
+    for _ in range(max_iter):
+        sy = sigma @ y
+        if np.abs(n * y * sy - 1).max() < tol:
+            converged = True
+            break
+
+        grad = sy - 1.0 / (n * y)
+        hess = sigma + np.diag(1.0 / (n * y * y))
+        step = -np.linalg.solve(hess, grad)
+
+        # n * objective is self-concordant, so the damped step 1 / (1 + decrement)
+        # keeps y > 0 and always decreases it; full steps once close to the optimum
+        decrement = np.sqrt(max(-n * (grad @ step), 0.0))
+        y = y + (step if decrement < 0.25 else step / (1 + decrement))
+
+    if not converged:
+        warnings.warn(
+            f'risk_parity_weights did not converge in {max_iter} iterations '
+            f'(max risk-contribution error {np.abs(n * y * (sigma @ y) - 1).max():.2e})',
+            RuntimeWarning,
+        )
+
+    w = np.zeros(n_all)
+    w[idx] = y / y.sum()
+    return w
+
+
+def risk_contributions(w, cov):
+    """Share of portfolio variance contributed by each asset (sums to 1)."""
+    rc = w * (cov @ w)
+    return rc / rc.sum()
+
+
+WEIGHTING_METHODS = {
+    'equal': equal_weights,
+    'inverse_vol': inverse_vol_weights,
+    'risk_parity': risk_parity_weights,
+}
+
+
+# =============================================================================
+# PORTFOLIO ENGINE
+# =============================================================================
+
+def build_portfolio(pair_returns, method='inverse_vol',
+                    halflife=60, warmup=60,
+                    vol_target=None, max_leverage=3.0,
+                    rebalance_band=0.0, tc_per_unit=0.0005,
+                    shrinkage=0.1, periods_per_year=TRADING_DAYS):
+    """
+    Risk-weighted portfolio of per-pair strategy returns.
+
+    Parameters:
+    -----------
+    pair_returns : DataFrame (bars x pairs) - e.g. ret_net of each pair;
+                   NaN marks a bar where the pair is not trading (not yet
+                   started or paused): it earns nothing and does not enter
+                   the covariance estimate
+    method : str - 'equal', 'inverse_vol' or 'risk_parity'
+    halflife : float - EWMA half-life in bars
+    warmup : int - Observed bars a pair needs before it gets any weight;
+             until the first pair has that many, the book is equal weight
+             across the pairs trading so far
+    vol_target : float - Annualized portfolio volatility target (None = fully invested, sum(w)=1)
+    max_leverage : float - Cap on sum(|w|) when vol-targeting
+    rebalance_band : float - Only trade when sum(|target - current|) exceeds this
+    tc_per_unit : float - Cost per unit of portfolio turnover
+    shrinkage : float - Weight on the diagonal when solving risk parity; an
+                EWMA matrix over many pairs is rank-deficient and has no
+                equal-risk solution without it
+    periods_per_year : int - Bars per year (252 daily; scale up for intraday)
+
+    Returns:
+    --------
+    portfolio : DataFrame with ret_gross, turnover, tc, ret_net, est_vol
+    weights : DataFrame (bars x pairs) - Weights held after each bar's close
+    """
+    if method not in WEIGHTING_METHODS:
+        raise ValueError(f'Unknown weighting method: {method!r}')
+
+    raw = pair_returns.to_numpy(dtype=np.float64)
+    returns = np.nan_to_num(raw)
+    n_bars, n_pairs = returns.shape
+
+    ewma = EWMACovariance(n_pairs, halflife)
+    weights = np.zeros((n_bars, n_pairs))
+    turnover = np.zeros(n_bars)
+    est_vol = np.full(n_bars, np.nan)
+
+    current = np.zeros(n_pairs)
+    rp_state = np.zeros(n_pairs)
+
+    for t in range(n_bars):
+        ewma.update(raw[t])
+        cov = ewma.covariance
+
+        # Target weights from information up to and including bar t; a pair
+        # only gets weight once its own covariance history is warmed up
+        eligible = ewma.n_updates >= warmup
+        target = np.zeros(n_pairs)
+        if not eligible.any():
+            started = ewma.n_updates > 0
+            if started.any():
+                target[started] = 1.0 / started.sum()
+        else:
+            idx = np.flatnonzero(eligible)
+            sub = cov[np.ix_(idx, idx)]
+            if method == 'risk_parity':
+                shrunk = (1 - shrinkage) * sub + shrinkage * np.diag(np.diag(sub))
+                w0 = rp_state[idx] if rp_state[idx].any() else None
+                target[idx] = risk_parity_weights(shrunk, w0=w0)
+                rp_state = target
+            else:
+                target[idx] = WEIGHTING_METHODS[method](sub)
+
+        port_var = float(target @ cov @ target)
+        if vol_target is not None and eligible.any() and port_var > 0:
+            scale = vol_target / np.sqrt(port_var * periods_per_year)
+            target = target * min(scale, max_leverage / np.abs(target).sum())
+
+        # Turnover-aware rebalance: stay put while inside the no-trade band.
+        # The initial allocation on bar 0 is funding, not a trade.
+        trade = target - current
+        if t == 0:
+            current = target
+        elif np.abs(trade).sum() > rebalance_band:
+            turnover[t] = np.abs(trade).sum()
+            current = target
+
+        weights[t] = current
+        est_vol[t] = np.sqrt(max(float(current @ cov @ current), 0.0) * periods_per_year)
+
+    # Weights set at the close of t earn bar t+1
+    ret_gross = np.zeros(n_bars)
+    ret_gross[1:] = (weights[:-1] * returns[1:]).sum(axis=1)
+    tc = turnover * tc_per_unit
+
+    portfolio = pd.DataFrame({
+        'ret_gross': ret_gross,
+        'turnover': turnover,
+        'tc': tc,
+        'ret_net': ret_gross - tc,
+        'est_vol': est_vol,
+    }, index=pair_returns.index)
+
+    return portfolio, pd.DataFrame(weights, index=pair_returns.index, columns=pair_returns.columns)
@@ -0,0 +1,82 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backtesting'))
+
+from backtest_result import FEATURE_COLUMNS, BacktestResult  # noqa: E402
+from cost_model import apply_constituent_costs  # noqa: E402
+
+PAIR = {'long': ['A', 'B'], 'short': ['C', 'D']}
+TC_PER_SIDE = 0.0005
+
+
+def _backtest_frame(seed=0, n_bars=1200):
+    """Frame with the columns backtest_with_ml produces, built the same way."""
+    rng = np.random.default_rng(seed)
+    index = pd.bdate_range('2016-01-01', periods=n_bars)
+    prices = pd.DataFrame(
+        100 * np.exp(np.cumsum(rng.normal(0, 0.015, size=(n_bars, 4)), axis=0)),
+        index=index, columns=list('ABCD'),
+    )
+
+    def basket(tickers):
+        return (prices[tickers] / prices[tickers].iloc[0]).mean(axis=1)
+
+    df = pd.DataFrame({
+        'ret_long': basket(PAIR['long']).pct_change().fillna(0),
+        'ret_short': basket(PAIR['short']).pct_change().fillna(0),
+        'vol_z': rng.normal(size=n_bars),
+        'ml_prob': rng.random(n_bars),
+    }, index=index)
+    for col in FEATURE_COLUMNS:
+        df[col] = rng.normal(size=n_bars)
+    df['z_score'] = df['vol_z']
+    df['ml_approved'] = df['ml_prob'] > 0.5
+    df['pos'] = rng.choice([-1.0, 0.0, 1.0], size=n_bars, p=[0.05, 0.9, 0.05])
+    df['pos_baseline'] = rng.choice([-1.0, 0.0, 1.0], size=n_bars, p=[0.05, 0.9, 0.05])
+
+    df['pair_ret'] = (df['pos'].shift(1) * (df['ret_long'] - df['ret_short'])).fillna(0)
+    df['turnover'] = df['pos'].diff().abs().fillna(0)
+    df['tc'] = df['turnover'] * (2 * TC_PER_SIDE)
+    df['ret_gross'] = df['pair_ret']
+    df['ret_net'] = df['ret_gross'] - df['tc']
+    df['ret_baseline'] = (df['pos_baseline'].shift(1) * (df['ret_long'] - df['ret_short'])).fillna(0)
+    turnover_baseline = df['pos_baseline'].diff().abs().fillna(0)
+    df['ret_baseline_net'] = df['ret_baseline'] - turnover_baseline * (2 * TC_PER_SIDE)
+    return df, prices
+
+
+def _assert_round_trip(df, result):
+    shared = [col for col in result.columns if col in df]
+    assert {'ret_net', 'ret_baseline_net', 'tc', 'turnover'} <= set(shared)
+    for col in shared:
+        expected = df[col].to_numpy()
+        if result[col].dtype == np.float32:
+            expected = expected.astype(np.float32)
+        np.testing.assert_array_equal(result[col].to_numpy(), expected, err_msg=col)
+
+
+def test_round_trip_spread_level_costs():
+    df, _ = _backtest_frame()
+    result = BacktestResult.from_frame(df, TC_PER_SIDE, keep_features=True)
+    _assert_round_trip(df, result)
+
+
+def test_round_trip_constituent_costs():
+    df, prices = _backtest_frame(seed=1)
+    apply_constituent_costs(df, prices, PAIR, schedule='monthly', half_spread=TC_PER_SIDE,
+                            impact_coef=0.1, adv={t: 5e7 for t in 'ABCD'})
+
+    result = BacktestResult.from_frame(df, TC_PER_SIDE, keep_features=True)
+    _assert_round_trip(df, result)
+
+
+def test_constituent_costs_without_baseline_repricing_rejected():
+    df, _ = _backtest_frame()
+    df['tc_spread'] = df['tc']
+    with pytest.raises(ValueError):
+        BacktestResult.from_frame(df, TC_PER_SIDE)
@@ -0,0 +1,31 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backtesting'))
+
+from bootstrap import (METRICS, batch_metrics, bootstrap_distributions,  # noqa: E402
+                       bootstrap_indices)
+
+
+def test_distributions_match_explicit_resamples_for_any_budget():
+    rng = np.random.default_rng(0)
+    returns = pd.DataFrame(rng.normal(0.0005, 0.01, size=(250, 5)))
+
+    dists = bootstrap_distributions(returns, n_boot=500, seed=7)
+    small = bootstrap_distributions(returns, n_boot=500, seed=7, max_memory_bytes=50_000)
+    reference = batch_metrics(returns.to_numpy()[bootstrap_indices(250, 500, seed=7)])
+
+    for metric in METRICS:
+        np.testing.assert_allclose(dists[metric], reference[metric], rtol=1e-10, atol=1e-12)
+        np.testing.assert_array_equal(dists[metric], small[metric])
+
+
+def test_batch_metrics_drawdown_matches_equity_curve():
+    resampled = np.random.default_rng(1).normal(0, 0.02, size=(20, 300, 3))
+    equity = np.cumprod(1 + resampled, axis=1)
+    expected = (equity / np.maximum.accumulate(equity, axis=1)).min(axis=1) - 1
+
+    np.testing.assert_allclose(batch_metrics(resampled)['max_drawdown'], expected, atol=1e-12)
@@ -0,0 +1,77 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backtesting'))
+
+from cost_model import (ConstituentCostModel, apply_constituent_costs,  # noqa: E402
+                        constituent_costs)
+
+PAIR = {'long': ['A', 'B', 'C'], 'short': ['D', 'E']}
+
+
+def _prices(n_bars=1500, seed=0):
+    rng = np.random.default_rng(seed)
+    index = pd.bdate_range('2015-01-01', periods=n_bars)
+    paths = 100 * np.exp(np.cumsum(rng.normal(0, 0.015, size=(n_bars, 5)), axis=0))
+    return pd.DataFrame(paths, index=index, columns=list('ABCDE'))
+
+
+def _create_basket_index(price_df, tickers):
+    # Notebook create_basket_index
+    subset = price_df[tickers].dropna()
+    return (subset / subset.iloc[0]).mean(axis=1)
+
+
+def _backtest_frame(price_df, seed=1):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'ret_long': _create_basket_index(price_df, PAIR['long']).pct_change(),
+        'ret_short': _create_basket_index(price_df, PAIR['short']).pct_change(),
+    }).iloc[139:]
+    df['pos'] = rng.choice([-1.0, 0.0, 1.0], size=len(df), p=[0.05, 0.9, 0.05])
+    df['pos_baseline'] = rng.choice([-1.0, 0.0, 1.0], size=len(df), p=[0.05, 0.9, 0.05])
+    return df
+
+
+def test_buy_and_hold_matches_spread_level_costs():
+    price_df = _prices()
+    df = _backtest_frame(price_df)
+    tc_per_side = 0.0005
+
+    costs, _ = constituent_costs(price_df, PAIR, df['pos'], half_spread=tc_per_side)
+
+    expected = df['pos'].diff().abs().fillna(0) * (2 * tc_per_side)
+    np.testing.assert_allclose(costs['tc'], expected, atol=1e-15)
+    np.testing.assert_allclose(costs['ret_long'], df['ret_long'], atol=1e-12)
+    np.testing.assert_allclose(costs['ret_short'], df['ret_short'], atol=1e-12)
+
+
+def test_strategy_and_baseline_share_one_cost_model():
+    price_df = _prices()
+    df = _backtest_frame(price_df)
+    df['pos_baseline'] = df['pos']
+    kwargs = dict(schedule='monthly', impact_coef=0.1, adv={t: 5e7 for t in 'ABCDE'})
+
+    apply_constituent_costs(df, price_df, PAIR, **kwargs)
+
+    np.testing.assert_allclose(df['ret_baseline'], df['ret_gross'])
+    np.testing.assert_allclose(df['ret_baseline_net'], df['ret_net'])
+    assert (df['tc_impact'] > 0).any()
+
+
+def test_shared_model_matches_per_pair_calls():
+    price_df = _prices()
+    price_df.iloc[:200, 1] = np.nan
+    df = _backtest_frame(price_df)
+    kwargs = dict(schedule='weekly', impact_coef=0.1, adv={t: 5e7 for t in 'ABCDE'})
+    pairs = {'one': PAIR, 'two': {'long': ['A', 'D'], 'short': ['C', 'E']}}
+
+    model = ConstituentCostModel(price_df, **kwargs)
+    for pair_def in pairs.values():
+        shared, shared_turnover = model.costs(pair_def, df['pos'])
+        single, single_turnover = constituent_costs(price_df, pair_def, df['pos'], **kwargs)
+        pd.testing.assert_frame_equal(shared, single)
+        pd.testing.assert_frame_equal(shared_turnover, single_turnover)
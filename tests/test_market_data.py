@@ -0,0 +1,145 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+from statsmodels.tsa.stattools import coint
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backtesting'))
+
+from market_data import (MarketData, calculate_half_life_array, feature_arrays,  # noqa: E402
+                         metrics_frame, volatility_metrics)
+from market_data import test_cointegration_arrays as cointegration_arrays  # noqa: E402
+
+PAIR = {'long': ['A', 'B'], 'short': ['C', 'D']}
+
+# -----------------------------------------------------------------------------
+# Notebook reference implementations (v4_Volatility_Dispersion_ML_Enhanced_V2)
+# -----------------------------------------------------------------------------
+
+
+def create_basket_index(price_df, tickers, start_idx=0):
+    subset = price_df[tickers].dropna()
+    return (subset / subset.iloc[start_idx]).mean(axis=1)
+
+
+def calculate_volatility_metrics(price_df, pair_def, vol_lookback=20, z_lookback=120):
+    long_idx = create_basket_index(price_df, pair_def['long'])
+    short_idx = create_basket_index(price_df, pair_def['short'])
+    ret_long = long_idx.pct_change().fillna(0)
+    ret_short = short_idx.pct_change().fillna(0)
+    vol_long = ret_long.rolling(vol_lookback).std() * np.sqrt(252)
+    vol_short = ret_short.rolling(vol_lookback).std() * np.sqrt(252)
+    vol_spread = vol_long - vol_short
+    vol_mu = vol_spread.rolling(z_lookback).mean()
+    vol_sig = vol_spread.rolling(z_lookback).std()
+    vol_z = (vol_spread - vol_mu) / vol_sig
+    return pd.DataFrame({
+        'long_idx': long_idx, 'short_idx': short_idx,
+        'ret_long': ret_long, 'ret_short': ret_short,
+        'vol_long': vol_long, 'vol_short': vol_short,
+        'vol_spread': vol_spread, 'vol_mu': vol_mu, 'vol_sig': vol_sig,
+        'vol_z': vol_z,
+    }).dropna()
+
+
+def engineer_features(df, vix_series):
+    features = df.copy()
+    features['z_score'] = features['vol_z']
+    features['z_change_10d'] = features['vol_z'].diff(10)
+    features['spread_vol_20d'] = features['vol_spread'].rolling(20).std()
+    spread_sign = np.sign(features['vol_spread'] - features['vol_mu'])
+    crossings = (spread_sign.diff().abs() > 0).astype(int)
+    features['days_since_crossing'] = crossings.groupby(crossings.cumsum()).cumcount()
+    features['corr_20d'] = features['ret_long'].rolling(20).corr(features['ret_short'])
+    features['vol_ratio'] = features['vol_long'] / (features['vol_short'] + 1e-8)
+    vix_aligned = vix_series.reindex(features.index, method='ffill')
+    features['vix_level'] = vix_aligned
+    features['vix_percentile'] = vix_aligned.rolling(252).rank(pct=True)
+    return features.replace([np.inf, -np.inf], np.nan)
+
+
+def calculate_half_life(spread_series):
+    spread = spread_series.dropna()
+    if len(spread) < 50:
+        return np.nan
+    centered = spread - spread.mean()
+    spread_lag = centered.shift(1).dropna()
+    spread_diff = centered.diff().dropna()
+    common = spread_lag.index.intersection(spread_diff.index)
+    slope, _, _, _, _ = stats.linregress(spread_lag.loc[common], spread_diff.loc[common])
+    if -1 < slope < 0:
+        return -np.log(2) / np.log(1 + slope)
+    return np.inf
+
+
+# -----------------------------------------------------------------------------
+# Tests
+# -----------------------------------------------------------------------------
+
+
+def _market(seed=0, n_bars=1500):
+    rng = np.random.default_rng(seed)
+    index = pd.bdate_range('2015-01-01', periods=n_bars)
+    prices = pd.DataFrame(
+        100 * np.exp(np.cumsum(rng.normal(0, 0.015, size=(n_bars, 4)), axis=0)),
+        index=index, columns=list('ABCD'),
+    )
+    vix = pd.Series(15 + 5 * np.abs(np.cumsum(rng.normal(0, 0.3, n_bars))), index=index)
+    return prices, vix, MarketData(prices, vix, train_end_date='2019-06-30')
+
+
+def test_volatility_metrics_match_notebook():
+    prices, _, md = _market()
+    expected = calculate_volatility_metrics(prices, PAIR)
+
+    start, metrics = volatility_metrics(md, PAIR)
+    actual = metrics_frame(md, start, metrics)
+
+    pd.testing.assert_index_equal(actual.index, expected.index)
+    for col in expected.columns:
+        np.testing.assert_allclose(actual[col], expected[col], rtol=1e-10, atol=1e-12, err_msg=col)
+
+
+def test_feature_arrays_match_notebook():
+    prices, vix, md = _market(seed=1)
+    start, metrics = volatility_metrics(md, PAIR)
+    expected = engineer_features(calculate_volatility_metrics(prices, PAIR), vix)
+
+    features = feature_arrays(md, start, metrics)
+
+    # vix_percentile is ranked over the full calendar by design
+    for col, values in features.items():
+        if col == 'vix_percentile':
+            continue
+        np.testing.assert_allclose(values, expected[col], rtol=1e-9, atol=1e-12, err_msg=col)
+    np.testing.assert_allclose(features['vix_percentile'], md.vix_percentile[start:])
+
+
+def test_stat_tests_match_notebook():
+    prices, _, md = _market(seed=2)
+    long_idx = create_basket_index(prices, PAIR['long'])
+    short_idx = create_basket_index(prices, PAIR['short'])
+    start, metrics = volatility_metrics(md, PAIR)
+
+    score, p_value, _ = cointegration_arrays(metrics['long_idx'], metrics['short_idx'])
+    expected_score, expected_p, _ = coint(long_idx.iloc[start:], short_idx.iloc[start:])
+    assert np.isclose(score, expected_score) and np.isclose(p_value, expected_p)
+
+    spread = metrics_frame(md, start, metrics)['vol_spread']
+    assert np.isclose(calculate_half_life_array(spread.to_numpy()), calculate_half_life(spread))
+
+
+def test_local_train_end_splits_trimmed_metrics_at_train_end_date():
+    prices, _, md = _market()
+    start, metrics = volatility_metrics(md, PAIR)
+    dates = metrics_frame(md, start, metrics).index
+
+    split = md.local_train_end(start)
+
+    assert dates[split - 1] <= pd.Timestamp('2019-06-30') < dates[split]
+
+    # A split before the first valid bar leaves everything out of sample
+    early = MarketData(prices, train_end_date=prices.index[50])
+    assert early.local_train_end(start) == 0
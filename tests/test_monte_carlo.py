@@ -0,0 +1,39 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backtesting'))
+
+from monte_carlo import fit_regime_model, monte_carlo  # noqa: E402
+
+
+def _model(seed=0, n_bars=1500):
+    rng = np.random.default_rng(seed)
+    index = pd.bdate_range('2015-01-01', periods=n_bars)
+    df = pd.DataFrame(rng.normal(0, 0.01, size=(n_bars, 2)),
+                      index=index, columns=['ret_long', 'ret_short'])
+    vix = pd.Series(np.where(np.arange(n_bars) < 1000, 15.0, 25.0), index=index)
+    return fit_regime_model(df, vix)
+
+
+def test_trades_count_round_trips():
+    paths = monte_carlo(_model(), n_paths=50, n_bars=800, chunk_size=20)
+
+    assert (paths['num_trades'] > 0).all()
+    # Each round trip is an entry and an exit; the last one may still be open
+    open_at_end = 2 * paths['num_trades'] - paths['num_position_changes']
+    assert open_at_end.isin([0, 1]).all()
+
+
+def test_unobserved_regime_is_unreachable():
+    model = _model()
+    assert model['init'][2] == 0
+    assert (model['trans'][:2, 2] == 0).all()
+
+
+def test_rejects_empty_run():
+    with pytest.raises(ValueError):
+        monte_carlo(_model(), n_paths=0)
@@ -0,0 +1,62 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backtesting'))
+
+from portfolio import build_portfolio, risk_contributions, risk_parity_weights  # noqa: E402
+
+
+def _sample_cov(n_pairs, n_obs, seed=0):
+    rng = np.random.default_rng(seed)
+    mixing = rng.normal(size=(n_pairs, n_pairs))
+    returns = rng.normal(size=(n_obs, n_pairs)) @ mixing * 0.01
+    return np.cov(returns, rowvar=False)
+
+
+def test_risk_parity_equal_contributions_many_pairs():
+    for n_pairs in (50, 100):
+        cov = _sample_cov(n_pairs, 2 * n_pairs, seed=n_pairs)
+        w = risk_parity_weights(cov)
+
+        assert np.all(w > 0)
+        assert np.isclose(w.sum(), 1.0)
+        rc = risk_contributions(w, cov)
+        np.testing.assert_allclose(rc, 1.0 / n_pairs, rtol=1e-5)
+
+
+def test_risk_parity_portfolio_turnover_stays_low():
+    rng = np.random.default_rng(1)
+    returns = pd.DataFrame(rng.normal(0, 0.01, size=(600, 30)))
+
+    portfolio, weights = build_portfolio(returns, method='risk_parity')
+
+    assert (weights.to_numpy() >= 0).all()
+    assert portfolio['turnover'].mean() < 0.1
+
+
+def test_late_starting_pair_waits_for_its_own_warmup():
+    rng = np.random.default_rng(2)
+    returns = pd.DataFrame(rng.normal(0, 0.01, size=(1000, 4)))
+    returns.iloc[:500, 0] = np.nan
+
+    for method in ('inverse_vol', 'risk_parity'):
+        portfolio, weights = build_portfolio(returns, method=method, warmup=60, vol_target=0.1)
+
+        assert (weights.iloc[:559, 0] == 0).all()
+        assert weights.iloc[559:, 0].max() < 0.5
+        assert portfolio['turnover'].iloc[100:].max() < 1.0
+
+
+def test_paused_pair_keeps_its_volatility_estimate():
+    rng = np.random.default_rng(3)
+    returns = pd.DataFrame(rng.normal(0, 0.01, size=(1000, 4)))
+    returns.iloc[400:700, 1] = np.nan
+
+    portfolio, weights = build_portfolio(returns, method='inverse_vol', vol_target=0.1)
+
+    # Back from the pause: weights stay close to equal risk, no jump
+    np.testing.assert_allclose(weights.iloc[700], weights.iloc[700].mean(), rtol=0.25)
+    assert portfolio['turnover'].iloc[100:].max() < 0.5